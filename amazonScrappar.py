@@ -1,13 +1,13 @@
 import os
-import time
 import re
+import asyncio
 import logging
 import pandas as pd
+from functools import partial
 from urllib.parse import quote
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import (
     TimeoutException,
@@ -16,6 +16,23 @@ from selenium.common.exceptions import (
     WebDriverException,
 )
 
+from browser_profile import chrome_factory, use_profile
+from driver_pool import DriverPool
+from fetcher import TieredFetcher, looks_blocked
+from metrics import metrics
+from page_cache import PageCache, CacheMiss
+from page_extract import ddg_amazon_link, amazon_weight_candidates
+from rate_limit import scheduler
+from result_store import ResultStore, resume_args
+from retry import retry_policy, Blocked, check_cancelled
+from sites import site_url
+from stage_data import read_dataset, write_dataset
+from url_index import url_index
+from variants import families, representatives, fan_out
+from waits import waiter
+from weight_kb import weight_kb
+from weight_units import parse_weight
+
 # Disable ChromeDriver/Chrome version check hack
 os.environ["CHROMEDRIVER_DISABLE_BUILD_CHECK"] = "1"
 
@@ -29,19 +46,6 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-# Mapping units to conversion functions (value → grams)
-UNIT_MAP = {
-    'kg':     lambda v: v * 1000,
-    'g':      lambda v: v,
-    'lb':     lambda v: v * 453.592,
-    'lbs':    lambda v: v * 453.592,
-    'pound':  lambda v: v * 453.592,
-    'pounds': lambda v: v * 453.592,
-    'oz':     lambda v: v * 28.3495,
-    'ounce':  lambda v: v * 28.3495,
-    'ounces': lambda v: v * 28.3495,
-}
-
 # ── INITIALIZE BROWSER ────────────────────────────────────────────────────────
 
 chrome_opts = webdriver.ChromeOptions()
@@ -52,147 +56,241 @@ chrome_opts.add_argument("--lang=en-US")
 chrome_opts.add_argument(
     "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
 )
-# chrome_opts.add_argument("--headless")  # enable for headless mode
+# Headless, eager loads and no images/fonts/trackers unless SCRAPER_BROWSER_PROFILE says otherwise
 
-driver = webdriver.Chrome(options=chrome_opts)
-wait   = WebDriverWait(driver, 10)
+# One warm browser, health-checked, recycled every 50 products and replaced if it crashes
+pool   = DriverPool(chrome_factory("amazon.com", chrome_opts), size=1, max_pages=50, timeout=10,
+                    name="amazon")
+
+# Fetched pages are reused across runs; see page_cache.py for TTL/offline settings
+cache  = PageCache()
 
 # ── WEIGHT EXTRACTION FUNCTION ────────────────────────────────────────────────
 
-def extract_weight(driver):
+def extract_weight(page_source):
     """
     Attempts to extract product weight from Amazon page using structured sections.
     Returns (grams:int, source_label:str) or (None, None) if not found.
     """
-    candidates = []
+    candidates = amazon_weight_candidates(page_source)
 
-    # 1) Table-based details
-    try:
-        table = driver.find_element(By.ID, "productDetails_detailBullets_sections1")
-        for row in table.find_elements(By.TAG_NAME, "tr"):
-            key = row.find_element(By.TAG_NAME, "th").text.strip()
-            val = row.find_element(By.TAG_NAME, "td").text.strip()
-            if "weight" in key.lower():
-                candidates.append((key, val))
-    except NoSuchElementException:
-        pass
-
-    # 2) Bullet-list details
-    try:
-        ul = driver.find_element(By.ID, "detailBullets_feature_div")
-        for li in ul.find_elements(By.TAG_NAME, "li"):
-            parts = li.text.split(":", 1)
-            if len(parts) == 2:
-                key, val = parts[0].strip(), parts[1].strip()
-                if "weight" in key.lower():
-                    candidates.append((key, val))
-    except NoSuchElementException:
-        pass
-
-    # 3) Tighter regex on each structured candidate
-    pattern = re.compile(r"(\d+(?:\.\d+)?)\s*(kg|g|lbs?|pounds?|oz|ounces?)", re.I)
+    # Shared weight matcher on each structured candidate
     for key, val in candidates:
-        m = pattern.search(val)
+        m = parse_weight(val)
         if m:
-            num  = float(m.group(1))
-            unit = m.group(2).lower().rstrip(".")
-            grams = int(UNIT_MAP[unit](num))
+            grams = int(m.grams)
             logging.info(f"     Found '{key}' → '{val}' → {grams} g")
             return grams, key
 
-    # 4) No structured match
+    # No structured match
     if candidates:
         logging.warning(f"     Candidates found but no regex match: {candidates}")
     else:
         logging.warning("     No weight candidates in structured sections")
     return None, None
 
+# Only these anchor a weight anywhere on the page; a bare "weight" is too common there
+FALLBACK_KEYWORDS = ("item weight", "shipping weight", "product weight")
+
+def extract_from_page(page_source):
+    """Structured extraction with a full-page regex fallback"""
+    grams, source = extract_weight(page_source)
+    if grams is None:
+        page = re.sub(r"<[^>]+>", " ", page_source)
+        fallback = parse_weight(page, keyed_only=True, keywords=FALLBACK_KEYWORDS)
+        if fallback:
+            grams = int(fallback.grams)
+            source = "full_page_regex"
+            logging.info(f"     Fallback regex matched → {grams} g")
+    return grams, source
+
+# ── TIERED FETCH: HTTP FIRST, BROWSER AS FALLBACK ─────────────────────────────
+
+HTTP_CONCURRENCY = 32   # total in-flight HTTP requests
+HTTP_PER_HOST    = 4    # per host (duckduckgo.com, amazon.com)
+
+def load_search_browser(url, cancelled=None):
+    """Browser fallback: the JavaScript DuckDuckGo results page"""
+    with pool.session() as s, scheduler.slot(url):
+        check_cancelled(cancelled)
+        use_profile(s, url)
+        with metrics.phase("navigation", "duckduckgo.com"):
+            s.driver.get(url)
+        waiter.until(s.driver, EC.presence_of_all_elements_located((
+            By.CSS_SELECTOR,
+            "a.result__a, a[data-testid='result-title-a']"
+        )), "duckduckgo.com")
+        return s.driver.page_source
+
+def load_product_browser(amazon_href, cancelled=None):
+    """Browser fallback: an Amazon product page"""
+    with pool.session() as s, scheduler.slot(amazon_href):
+        check_cancelled(cancelled)
+        use_profile(s, amazon_href)
+        with metrics.phase("navigation", "amazon.com"):
+            s.driver.get(amazon_href)
+        waiter.until(s.driver, EC.url_contains("amazon.com"), "amazon.com")
+        # Either detail layout (absent on some listings, so don't fail on it)
+        waiter.until(s.driver, EC.presence_of_element_located((
+            By.CSS_SELECTOR,
+            "#productDetails_detailBullets_sections1, #detailBullets_feature_div"
+        )), "amazon.com", required=False)
+        html = s.driver.page_source
+    blocked = looks_blocked(html)
+    scheduler.feedback(amazon_href, blocked=blocked)
+    if blocked:
+        # Raised so the bot wall isn't cached; run() retries after a backoff
+        raise Blocked(f"bot wall on {amazon_href}")
+    return html
+
+def has_detail_section(html):
+    return "productDetails_detailBullets_sections1" in html or "detailBullets_feature_div" in html
+
+async def product_weight(fetcher, product, amazon_href, tier, where, cancelled=None):
+    """Fetch an Amazon product page and extract its weight: (grams, source)"""
+    logging.info(f" Amazon page ({tier}): {amazon_href}")
+    where["url"] = amazon_href
+    with metrics.phase("product-page", "amazon.com"):
+        page_source, tier = await fetcher.fetch(
+            "amazon", amazon_href, amazon_href,
+            accept=has_detail_section,
+            browser=partial(load_product_browser, amazon_href, cancelled),
+        )
+    with metrics.phase("extraction", "amazon"):
+        grams, source = extract_from_page(page_source)
+    logging.info(f"     '{product}' served by {tier}")
+    return grams, source
+
+async def lookup(fetcher, product, where, model=None, cancelled=None):
+    """
+    Resolve one product to (grams, source, url). The Amazon URL comes from
+    the URL index (by Model Number, then name) when known; otherwise from a
+    search. Search and product pages come from the cache, then plain HTTP
+    (DuckDuckGo's server-rendered HTML endpoint, Amazon's server HTML), and
+    only then a browser. Only URLs that yielded a weight are indexed; an
+    indexed URL that no longer does is forgotten and searched again.
+    `where["url"]` tracks the page being worked on for the failure log;
+    `cancelled` stops a browser fallback still queued for a session.
+    """
+    amazon_href = url_index.get("amazon", product, model)
+    if amazon_href:
+        metrics.count("index-hit", "amazon")
+        grams, source = await product_weight(fetcher, product, amazon_href, "index", where, cancelled)
+        if grams is not None:
+            return grams, source, amazon_href
+        url_index.forget("amazon", product, model)
+
+    query = f"{product} amazon"
+    logging.info(f"🔍 Searching: {query}")
+
+    # DuckDuckGo search
+    where["url"] = site_url(f"https://duckduckgo.com/?q={quote(query)}&t=h_&ia=web")
+    with metrics.phase("search", "duckduckgo.com"):
+        search_page, tier = await fetcher.fetch(
+            "ddg", query, site_url(f"https://html.duckduckgo.com/html/?q={quote(query)}"),
+            accept=lambda html: "result__a" in html,
+            browser=partial(load_search_browser, where["url"], cancelled),
+        )
+        amazon_href = ddg_amazon_link(search_page)
+    if not amazon_href:
+        return None, "no_amazon_link", "no_amazon_link"
+
+    # Amazon product page
+    grams, source = await product_weight(fetcher, product, amazon_href, tier, where, cancelled)
+    if grams is not None:
+        url_index.put("amazon", amazon_href, product, model)
+    return grams, source, amazon_href
+
 # ── MAIN WORKFLOW ─────────────────────────────────────────────────────────────
 
+async def run(to_fill, store, no_match_log):
+    async with TieredFetcher(cache=cache, pool=pool, concurrency=HTTP_CONCURRENCY,
+                             per_host=HTTP_PER_HOST) as fetcher:
+
+        async def attempt(idx, product, model):
+            where = {"url": None}
+            try:
+                # Transient and blocked failures are retried with backoff; the
+                # breaker pauses a domain that keeps blocking instead of failing every row
+                result = await retry_policy.run(lambda: lookup(fetcher, product, where, model),
+                                                lambda: where["url"])
+                return idx, product, where, result, None
+            except Exception as e:
+                return idx, product, where, None, e
+
+        tasks = [attempt(idx, row["Product Name"], row.get("Model Number"))
+                 for idx, row in to_fill.iterrows()]
+        for next_done in asyncio.as_completed(tasks):
+            idx, product, where, result, error = await next_done
+            url = where["url"]
+
+            if error is None:
+                grams, source, url = result
+                # Record result (committed immediately so an interrupted run can --resume)
+                metrics.outcome("amazon", grams is not None, f"ddg→amazon({source})", product)
+                if grams is not None:
+                    store.record(idx, product, grams, "g", f"ddg→amazon({source})", url)
+                    logging.info(f" Parsed weight for '{product}': {grams} g")
+                elif source == "no_amazon_link":
+                    logging.error(f"No Amazon link in search results for '{product}'.")
+                    store.record(idx, product, source="no_amazon_link")
+                    no_match_log.append((product, "no_amazon_link"))
+                else:
+                    logging.error(f" Could not extract weight for '{product}'")
+                    store.record(idx, product, source=url)
+                    no_match_log.append((product, url))
+            elif isinstance(error, Blocked):
+                metrics.count("blocked", "amazon")
+                logging.error(f" Blocked while looking up '{product}': {error}")
+                no_match_log.append((product, url))
+            elif isinstance(error, CacheMiss):
+                metrics.count("cache-miss", "amazon")
+                logging.info(f" Not cached, skipped in cache-only mode: '{product}'")
+            elif isinstance(error, (TimeoutException, NoSuchElementException, StaleElementReferenceException)):
+                metrics.count("timeout", "amazon")
+                logging.error(f" Timeout/Element error for '{product}': {error}")
+                no_match_log.append((product, url))
+            elif isinstance(error, WebDriverException):
+                # The pool replaces a crashed browser on the next checkout, so keep going
+                metrics.count("driver-error", "amazon")
+                logging.error(f"WebDriver error for '{product}': {error}")
+                no_match_log.append((product, url))
+            else:
+                metrics.count("error", "amazon")
+                logging.error(f" Unexpected error for '{product}': {error}")
+                no_match_log.append((product, url))
+
 def main():
-    # Load Excel and isolate rows needing weights
-    df = pd.read_excel("product_details.xlsx")
-    df = df.fillna("")
-    df["Weight"] = pd.to_numeric(df["Weight"], errors="coerce").fillna(0)
-    to_fill = df[df["Weight"] == 0].copy()
+    args = resume_args("Fill missing weights from Amazon via DuckDuckGo").parse_args()
+    store = ResultStore("amazon", resume=args.resume)
+
+    # Load the typed dataset and isolate rows needing weights (minus rows finished by an earlier run)
+    df = read_dataset("product_details")
+    # Products resolved by earlier runs are filled from the knowledge base, not scraped
+    known = weight_kb.fill(df)
+    # Colour/storage/region variants share a weight: scrape one row per family
+    family = families(df)
+    filled = fan_out(df, family)
+    to_fill = representatives(store.pending(df[df["Weight"] == 0].copy()), family)
+    logging.info(f" {known} rows known from earlier runs, {filled} filled from variants; {len(to_fill)} family representatives to search")
 
     # Track failures for manual review
     no_match_log = []
+    asyncio.run(run(to_fill, store, no_match_log))
 
-    for idx, row in to_fill.iterrows():
-        product = row["Product Name"]
-        query   = f"{product} amazon"
-        logging.info(f"🔍 Searching: {query}")
-
-        try:
-            # DuckDuckGo search
-            ddg_url = f"https://duckduckgo.com/?q={quote(query)}&t=h_&ia=web"
-            driver.get(ddg_url)
-            links = wait.until(EC.presence_of_all_elements_located((
-                By.CSS_SELECTOR,
-                "a.result__a, a[data-testid='result-title-a']"
-            )))
-
-            amazon_href = next(
-                (a.get_attribute("href") for a in links if "amazon.com" in (a.get_attribute("href") or "").lower()),
-                None
-            )
-            if not amazon_href:
-                logging.error("No Amazon link in search results.")
-                no_match_log.append((product, "no_amazon_link"))
-                continue
-
-            # Navigate to Amazon
-            logging.info(f" Navigate to Amazon: {amazon_href}")
-            driver.get(amazon_href)
-            wait.until(EC.url_contains("amazon.com"))
-            time.sleep(2)
-
-            # Extract weight
-            grams, source = extract_weight(driver)
-
-            # Fallback: full page regex
-            if grams is None:
-                page = driver.page_source.lower()
-                fallback = re.search(
-                    r"(?:item weight|shipping weight|product weight)[^\n]*?(\d+(?:\.\d*)?)\s*(kg|g|lbs?|pounds?|oz|ounces?)",
-                    page
-                )
-                if fallback:
-                    num  = float(fallback.group(1))
-                    unit = fallback.group(2).lower().rstrip(".")
-                    grams = int(UNIT_MAP[unit](num))
-                    source = "full_page_regex"
-                    logging.info(f"     Fallback regex matched → {grams} g")
-
-            # Record result
-            if grams is not None:
-                df.at[idx, "Weight"] = grams
-                df.at[idx, "Detection Method"] = f"ddg→amazon({source})"
-                logging.info(f" Parsed weight: {grams} g")
-            else:
-                logging.error(f" Could not extract weight for '{product}'")
-                no_match_log.append((product, driver.current_url))
-
-        except (TimeoutException, NoSuchElementException, StaleElementReferenceException) as e:
-            logging.error(f" Timeout/Element error for '{product}': {e}")
-            no_match_log.append((product, driver.current_url))
-        except WebDriverException as e:
-            logging.error(f"WebDriver error: {e}")
-            break
-        except Exception as e:
-            logging.error(f" Unexpected error for '{product}': {e}")
-            no_match_log.append((product, driver.current_url))
-
-    # Save outputs
-    df.to_excel("final_weight_ddg_amazon.xlsx", index=False)
+    # Save outputs, including rows committed by earlier runs
+    store.apply(df)
+    fan_out(df, family)
+    weight_kb.learn(df, "final_weight_ddg_amazon")
+    write_dataset(df, "final_weight_ddg_amazon")
     if no_match_log:
         pd.DataFrame(no_match_log, columns=["Product", "Note_or_URL"]) \
           .to_excel("no_match_log.xlsx", index=False)
+    metrics.report("amazon")
     logging.info(" Done! Outputs saved.")
 
 if __name__ == "__main__":
     try:
         main()
     finally:
-        driver.quit()
+        pool.close()
@@ -0,0 +1,184 @@
+import io
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+
+# Benchmarks never touch the real caches/indexes the scrapers create on import
+for var in ("SCRAPER_CACHE_PATH", "SCRAPER_RESULTS_PATH", "SCRAPER_URL_INDEX", "SCRAPER_WEIGHT_KB"):
+    os.environ.setdefault(var, ":memory:")
+os.environ.setdefault("SCRAPER_TRACE", "")
+
+import amazonScrappar
+import scrapperForWeight
+import scrapper_support
+import weightFinder
+from page_extract import body_text
+from weight_units import parse_weight
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+FIXTURES = os.path.join(BENCH_DIR, "fixtures")
+LABELS = os.path.join(BENCH_DIR, "labels.json")
+RESULTS = os.path.join(BENCH_DIR, "results.jsonl")
+
+TOLERANCE = 0.01   # relative error still counted as correct
+
+# ── 1. Extractors under test ───────────────────────────────────────────────────
+# Each takes a saved page and returns grams or None; grouped by fixture kind.
+def _grams(match):
+    return match.grams if match else None
+
+def _nonzero(value):
+    return value or None
+
+EXTRACTORS = {
+    "amazon": {
+        "amazon.extract_from_page": lambda html: amazonScrappar.extract_from_page(html)[0],
+        "amazon.extract_weight":    lambda html: amazonScrappar.extract_weight(html)[0],
+        "parse_weight(page text)":  lambda html: _grams(parse_weight(body_text(html))),
+    },
+    "mi-specs": {
+        "specs.find_spec_weight":   lambda html: scrapperForWeight.find_spec_weight(html)[0],
+        "parse_weight(page text)":  lambda html: _grams(parse_weight(body_text(html))),
+    },
+    "mi-support": {
+        "support.preview_weight":   lambda html: _grams(scrapper_support.preview_weight(html)),
+        "support.page_weight":      lambda html: _grams(scrapper_support.page_weight(html)),
+    },
+    "body": {
+        "weightFinder.process_body": lambda html: _nonzero(weightFinder.process_body(html)["Weight"]),
+        "parse_weight(body text)":   lambda html: _grams(parse_weight(weightFinder.parse_body(html)[1])),
+    },
+}
+
+# ── 2. Measurement ─────────────────────────────────────────────────────────────
+def load_corpus():
+    """[(file, kind, html, expected grams | None)] from bench/labels.json"""
+    with open(LABELS, encoding="utf-8") as f:
+        labels = json.load(f)
+    corpus = []
+    for name, label in labels.items():
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            corpus.append((name, label["kind"], f.read(), label["grams"]))
+    return corpus
+
+def is_correct(got, expected):
+    if expected is None or got is None:
+        return got is None and expected is None
+    return abs(got - expected) <= TOLERANCE * expected
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def bench_extractor(extract, pages, repeat):
+    """Time `extract` over every page `repeat` times; accuracy from the first pass"""
+    latencies, misses, correct = [], [], 0
+    total_bytes = sum(len(html.encode("utf-8")) for _, html, _ in pages)
+    with redirect_stdout(io.StringIO()):
+        for name, html, expected in pages:
+            got = extract(html)
+            if is_correct(got, expected):
+                correct += 1
+            else:
+                misses.append({"file": name, "expected": expected, "got": got})
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for _, html, _ in pages:
+                t0 = time.perf_counter()
+                extract(html)
+                latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+    return {
+        "pages": len(pages),
+        "accuracy": round(correct / len(pages), 4),
+        "pages_per_sec": round(len(latencies) / elapsed, 1),
+        "mb_per_sec": round(total_bytes * repeat / elapsed / 1e6, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "misses": misses,
+    }
+
+def run(repeat, only=None):
+    corpus = load_corpus()
+    results = {}
+    for kind, extractors in EXTRACTORS.items():
+        pages = [(name, html, grams) for name, k, html, grams in corpus if k == kind]
+        if not pages:
+            continue
+        for label, extract in extractors.items():
+            if only and only not in label:
+                continue
+            results[f"{kind}/{label}"] = bench_extractor(extract, pages, repeat)
+    return results
+
+# ── 3. Saved runs ──────────────────────────────────────────────────────────────
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=BENCH_DIR, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def previous_run():
+    if not os.path.exists(RESULTS):
+        return None
+    with open(RESULTS, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+def save_run(results, repeat):
+    record = {
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "results": results,
+    }
+    with open(RESULTS, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def report(results, baseline=None):
+    old = (baseline or {}).get("results", {})
+    print(f"{'extractor':<45} {'acc':>6} {'pages/s':>10} {'MB/s':>7} {'p50 ms':>8} {'p95 ms':>8}  vs last")
+    for name, r in results.items():
+        delta = ""
+        if name in old:
+            speed = r["pages_per_sec"] / old[name]["pages_per_sec"] - 1
+            acc = r["accuracy"] - old[name]["accuracy"]
+            delta = f"{speed:+.0%} speed"
+            if acc:
+                delta += f", {acc:+.0%} accuracy"
+        print(f"{name:<45} {r['accuracy']:>6.0%} {r['pages_per_sec']:>10.1f} {r['mb_per_sec']:>7.2f} "
+              f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f}  {delta}")
+        for miss in r["misses"]:
+            print(f"    ✗ {miss['file']}: expected {miss['expected']}, got {miss['got']}")
+    if baseline:
+        print(f"\nCompared with {baseline['recorded_at']} ({baseline.get('revision') or 'unknown revision'})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the weight extractors on the saved-page corpus in bench/")
+    parser.add_argument("--repeat", type=int, default=50, help="timed passes over the corpus")
+    parser.add_argument("--only", default=None, help="run extractors whose name contains this text")
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to bench/results.jsonl")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    baseline = previous_run()
+    results = run(args.repeat, args.only)
+    report(results, baseline)
+    if not args.no_save:
+        save_run(results, args.repeat)
+        print(f"Saved to {os.path.relpath(RESULTS)}")
+    # Non-zero exit when accuracy dropped, so the script can gate changes
+    if baseline and any(r["accuracy"] < baseline["results"].get(n, r)["accuracy"] for n, r in results.items()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import platform
+import threading
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Scrapers read these on import: point them at the mock sites and keep them
+# away from the real caches, indexes and knowledge base
+MOCK_PORT = int(os.environ.get("SCRAPER_MOCK_PORT") or _free_port())
+os.environ["SCRAPER_SITE_BASE"] = f"http://127.0.0.1:{MOCK_PORT}"
+for var in ("SCRAPER_CACHE_PATH", "SCRAPER_RESULTS_PATH", "SCRAPER_URL_INDEX", "SCRAPER_WEIGHT_KB"):
+    os.environ[var] = ":memory:"
+os.environ.setdefault("SCRAPER_TRACE", "")
+
+from bench_extractors import BENCH_DIR, git_revision, percentile
+from mock_sites import MockSites, MockConfig, expected_grams
+from rate_limit import scheduler, DEFAULT_LIMITS
+from retry import retry_policy, CircuitBreaker
+from weight_units import to_grams
+
+RESULTS = os.path.join(BENCH_DIR, "scaling.jsonl")
+
+TOLERANCE = 0.02        # relative error still counted as correct (Amazon rounds to 2 decimals)
+MAX_ERROR_RATE = 0.05   # levels failing more items than this can't be "best"
+
+# ── 1. Targets ─────────────────────────────────────────────────────────────────
+# Each runs the real lookup code for `products` with `workers` concurrent
+# lookups and returns [(product, seconds, grams | None, error | None)].
+def _timed(lookup, name):
+    start = time.perf_counter()
+    try:
+        grams = lookup(name)
+        return name, time.perf_counter() - start, grams, None
+    except Exception as e:
+        return name, time.perf_counter() - start, None, repr(e)
+
+def run_amazon(products, workers):
+    """TieredFetcher: HTTP first, the browser pool only as fallback"""
+    import amazonScrappar
+    from fetcher import TieredFetcher
+
+    async def main():
+        async with TieredFetcher(pool=amazonScrappar.pool, concurrency=workers, per_host=workers) as fetcher:
+            bound = asyncio.Semaphore(workers)
+
+            async def one(name):
+                async with bound:
+                    start = time.perf_counter()
+                    where = {"url": None}
+                    try:
+                        grams, _, _ = await retry_policy.run(
+                            lambda: amazonScrappar.lookup(fetcher, name, where), lambda: where["url"])
+                        return name, time.perf_counter() - start, grams, None
+                    except Exception as e:
+                        return name, time.perf_counter() - start, None, repr(e)
+
+            return await asyncio.gather(*(one(name) for name in products))
+
+    try:
+        return asyncio.run(main())
+    finally:
+        amazonScrappar.pool.close()
+
+def run_mi_specs(products, workers):
+    """lookup_specs on a pool of `workers` browsers"""
+    import scrapperForWeight
+    scrapperForWeight.pool.resize(workers)
+
+    def lookup(name):
+        return retry_policy.call(lambda: scrapperForWeight.lookup_specs(name), "mi.com")[0]
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as exe:
+            return list(exe.map(lambda name: _timed(lookup, name), products))
+    finally:
+        scrapperForWeight.pool.close()
+
+def run_mi_support(products, workers):
+    """process_row exactly as scrapper_support.main() runs it, with MAX_WORKERS = workers"""
+    import scrapper_support
+    scrapper_support.pool.resize(workers)
+
+    def lookup(name):
+        _, val, unit, method = scrapper_support.process_row(0, {"Product Name": name})
+        if not method:
+            raise RuntimeError("gave up after retries")
+        return to_grams(val, unit) if val is not None else None
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as exe:
+            return list(exe.map(lambda name: _timed(lookup, name), products))
+    finally:
+        scrapper_support.pool.close()
+
+TARGETS = {
+    "amazon": run_amazon,
+    "mi-specs": run_mi_specs,
+    "mi-support": run_mi_support,
+}
+
+# ── 2. Resource use ────────────────────────────────────────────────────────────
+def _cpu_seconds():
+    """CPU time of this process plus finished child processes (browsers, once quit)"""
+    if resource is None:
+        return time.process_time()
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+class MemorySampler:
+    """Peak RSS of this process and its children (browsers included) while running; needs psutil"""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        me = psutil.Process()
+        while not self._stop.is_set():
+            total = 0
+            for proc in [me] + me.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, total)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if psutil is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def peak_mb(self):
+        if psutil is not None:
+            return round(self.peak / 1e6, 1)
+        if resource is not None:
+            # Lifetime peak of this process only (KB on Linux)
+            return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1)
+        return None
+
+# ── 3. Measurement ─────────────────────────────────────────────────────────────
+def is_correct(got, expected):
+    if expected is None or got is None:
+        return got is None and expected is None
+    return abs(got - expected) <= TOLERANCE * expected
+
+def run_level(target, workers, products, sites):
+    # Every level starts from the same state: no learned pacing, closed breakers
+    sites.reset()
+    scheduler.reset()
+    retry_policy.breaker = CircuitBreaker()
+
+    cpu = _cpu_seconds()
+    start = time.perf_counter()
+    with MemorySampler() as memory, redirect_stdout(io.StringIO()):
+        items = TARGETS[target](products, workers)
+    elapsed = time.perf_counter() - start
+    cpu = _cpu_seconds() - cpu
+
+    latencies = [seconds for _, seconds, _, _ in items]
+    errors = [error for _, _, _, error in items if error]
+    correct = sum(is_correct(grams, expected_grams(name)) for name, _, grams, error in items if not error)
+    served = sites.stats()
+    total = lambda key: sum(host.get(key, 0) for host in served.values())
+    return {
+        "workers": workers,
+        "products": len(items),
+        "seconds": round(elapsed, 2),
+        "items_per_sec": round(len(items) / elapsed, 3),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "errors": len(errors),
+        "accuracy": round(correct / len(items), 4),
+        "cpu_s": round(cpu, 2),
+        "peak_rss_mb": memory.peak_mb(),
+        "requests": total("requests"),
+        "rate_limited": total("rate-limited"),
+        "server_errors": total("errors"),
+        "blocked": total("blocked"),
+        "first_error": errors[0] if errors else None,
+    }
+
+def best_level(levels):
+    """Highest throughput among levels that stayed within MAX_ERROR_RATE"""
+    healthy = [level for level in levels if level["errors"] <= MAX_ERROR_RATE * level["products"]]
+    return max(healthy, key=lambda level: level["items_per_sec"]) if healthy else None
+
+# ── 4. Saved runs ──────────────────────────────────────────────────────────────
+def previous_run(target, config, unthrottled):
+    """Last saved run of the same target against the same mock settings"""
+    if not os.path.exists(RESULTS):
+        return None
+    with open(RESULTS, encoding="utf-8") as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    same = [r for r in runs if r["target"] == target and r["config"] == config and r["unthrottled"] == unthrottled]
+    return same[-1] if same else None
+
+def save_run(record):
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    with open(RESULTS, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def regressions(levels, baseline, threshold):
+    """Levels slower than the baseline's by more than `threshold`, or less accurate"""
+    old = {level["workers"]: level for level in (baseline or {}).get("levels", [])}
+    found = []
+    for level in levels:
+        before = old.get(level["workers"])
+        if not before:
+            continue
+        if level["items_per_sec"] < before["items_per_sec"] * (1 - threshold):
+            found.append(f"{level['workers']} workers: {before['items_per_sec']} → {level['items_per_sec']} items/s")
+        if level["accuracy"] < before["accuracy"]:
+            found.append(f"{level['workers']} workers: accuracy {before['accuracy']:.0%} → {level['accuracy']:.0%}")
+    return found
+
+def report(target, levels, baseline=None):
+    base = levels[0]
+    print(f"\n{target}: {base['products']} products per level")
+    print(f"{'workers':>7} {'items/s':>8} {'eff':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'acc':>5} {'err':>4} {'429':>5} {'cpu s':>7} {'rss MB':>7}  vs last")
+    old = {level["workers"]: level for level in (baseline or {}).get("levels", [])}
+    for level in levels:
+        # Throughput gained per added worker, relative to the first level
+        efficiency = (level["items_per_sec"] / base["items_per_sec"]) / (level["workers"] / base["workers"])
+        delta = ""
+        if level["workers"] in old:
+            delta = f"{level['items_per_sec'] / old[level['workers']]['items_per_sec'] - 1:+.0%}"
+        print(f"{level['workers']:>7} {level['items_per_sec']:>8.2f} {efficiency:>5.0%} {level['p50_ms']:>8.0f} "
+              f"{level['p95_ms']:>8.0f} {level['p99_ms']:>8.0f} {level['accuracy']:>5.0%} {level['errors']:>4} "
+              f"{level['rate_limited']:>5} {level['cpu_s']:>7.1f} {str(level['peak_rss_mb'] or '-'):>7}  {delta}")
+        if level["first_error"]:
+            print(f"        first error: {level['first_error'][:120]}")
+    best = best_level(levels)
+    if best:
+        print(f"\nBest: {best['workers']} workers ({best['items_per_sec']:.2f} items/s)")
+    if baseline:
+        print(f"Compared with {baseline['recorded_at']} ({baseline.get('revision') or 'unknown revision'})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how the scrapers scale with concurrency against local mock sites")
+    parser.add_argument("--target", default="amazon", choices=list(TARGETS))
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--products", type=int, default=40, help="products per level")
+    parser.add_argument("--latency", type=float, default=150.0, help="mean mock latency in ms")
+    parser.add_argument("--jitter", type=float, default=50.0, help="mock latency standard deviation in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500 answers")
+    parser.add_argument("--block-rate", type=float, default=0.0, help="share of bot walls / 429s")
+    parser.add_argument("--rate", type=float, default=0.0, help="mock requests/s per host before 429s (0 = off)")
+    parser.add_argument("--popup-rate", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-throttle", action="store_true",
+                        help="lift the scheduler's per-domain limits to measure the code's own ceiling")
+    parser.add_argument("--regression", type=float, default=0.2,
+                        help="exit non-zero if a level's throughput drops by more than this vs the last run")
+    parser.add_argument("--no-save", action="store_true", help="don't append this run to bench/scaling.jsonl")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    config = MockConfig(args.latency, args.jitter, args.error_rate, args.block_rate, args.rate, args.popup_rate)
+    if args.no_throttle:
+        scheduler.limits = {domain: (1000.0, 1000, 1000) for domain in DEFAULT_LIMITS}
+
+    sites = MockSites(config, seed=args.seed)
+    sites.start(port=MOCK_PORT)
+    levels = []
+    try:
+        for workers in (int(w) for w in args.workers.split(",") if w):
+            # Fresh names per level, so no level is served by an earlier one's caches
+            products = [f"Xiaomi Mock Device {i} L{workers}" for i in range(args.products)]
+            print(f"⏱️ {args.target}: {workers} workers …", file=sys.stderr)
+            levels.append(run_level(args.target, workers, products, sites))
+    finally:
+        sites.stop()
+
+    baseline = previous_run(args.target, config._asdict(), args.no_throttle)
+    report(args.target, levels, baseline)
+    if not args.no_save:
+        save_run({
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "target": args.target,
+            "config": config._asdict(),
+            "unthrottled": args.no_throttle,
+            "levels": levels,
+        })
+        print(f"Saved to {os.path.relpath(RESULTS)}")
+    # Non-zero exit on a scaling regression, so the script can gate changes
+    slower = regressions(levels, baseline, args.regression)
+    for line in slower:
+        print(f"⚠️ Regression: {line}")
+    if slower:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import logging
+from typing import NamedTuple, Tuple
+
+from selenium import webdriver
+
+from waits import domain_of
+
+class Profile(NamedTuple):
+    headless: bool
+    page_load: str                  # 'normal', 'eager' or 'none'
+    block_images: bool
+    blocked_urls: Tuple[str, ...]   # Chrome DevTools URL patterns, '*' wildcards
+
+# Heavy resources nobody scrapes: fonts, video/audio and the images Chrome
+# would fetch even with image rendering off (CSS backgrounds, sprites)
+HEAVY_RESOURCES = (
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3", "*.ogg",
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+)
+
+# Ad, analytics and tracker hosts seen on Amazon, DuckDuckGo and mi.com pages
+TRACKER_HOSTS = (
+    "*doubleclick.net*", "*googlesyndication.com*", "*google-analytics.com*",
+    "*googletagmanager.com*", "*googleadservices.com*", "*amazon-adsystem.com*",
+    "*fls-na.amazon.com*", "*unagi.amazon.com*", "*facebook.net*", "*facebook.com/tr*",
+    "*criteo.com*", "*criteo.net*", "*scorecardresearch.com*", "*hotjar.com*",
+    "*bat.bing.com*", "*clarity.ms*", "*tiktok.com*", "*mistat.xiaomi.com*",
+)
+
+LEAN = Profile(headless=True, page_load="eager", block_images=True,
+               blocked_urls=HEAVY_RESOURCES + TRACKER_HOSTS)
+FULL = Profile(headless=False, page_load="normal", block_images=False, blocked_urls=())
+PROFILES = {"lean": LEAN, "full": FULL}
+
+# domain → profile name; SCRAPER_BROWSER_PROFILE overrides, e.g. "mi.com=full,default=lean"
+DOMAIN_PROFILES = {"default": "lean", "amazon.com": "lean", "duckduckgo.com": "lean", "mi.com": "lean"}
+for item in os.environ.get("SCRAPER_BROWSER_PROFILE", "").split(","):
+    if "=" in item:
+        domain, name = item.split("=", 1)
+        DOMAIN_PROFILES[domain.strip()] = name.strip()
+
+def profile_for(target):
+    """Profile for a URL or bare domain (subdomains use their parent's)"""
+    domain = domain_of(target) if "/" in target else target.lower()
+    for known, name in DOMAIN_PROFILES.items():
+        if domain == known or domain.endswith("." + known):
+            return PROFILES[name]
+    return PROFILES[DOMAIN_PROFILES["default"]]
+
+def apply_options(options, domain):
+    """Add the domain's profile settings to ChromeOptions; things a running browser can't change"""
+    profile = profile_for(domain)
+    options.page_load_strategy = profile.page_load
+    if profile.headless:
+        options.add_argument("--headless=new")
+        # Desktop layout, so the header search box and tabs render as when headed
+        options.add_argument("--window-size=1920,1080")
+    if profile.block_images:
+        prefs = dict(options.experimental_options.get("prefs", {}))
+        prefs["profile.managed_default_content_settings.images"] = 2
+        options.add_experimental_option("prefs", prefs)
+    return options
+
+def block_urls(driver, patterns):
+    """Install a URL blocklist through the DevTools protocol; False if the driver has none"""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+        return True
+    except Exception as e:
+        # Non-Chromium drivers have no DevTools protocol; they just load everything
+        logging.debug(f"URL blocklist not applied: {e}")
+        return False
+
+def use_profile(session, target):
+    """Switch a pooled session's blocklist to the profile of `target`'s domain (no-op if unchanged)"""
+    patterns = profile_for(target).blocked_urls
+    if session.state.get("blocked_urls") != patterns and block_urls(session.driver, patterns):
+        session.state["blocked_urls"] = patterns
+
+def chrome_factory(domain, options=None):
+    """DriverPool factory: Chrome launched with `domain`'s profile and blocklist"""
+    options = apply_options(options or webdriver.ChromeOptions(), domain)
+
+    def build():
+        driver = webdriver.Chrome(options=options)
+        block_urls(driver, profile_for(domain).blocked_urls)
+        return driver
+
+    return build
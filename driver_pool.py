@@ -0,0 +1,122 @@
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+from metrics import metrics
+
+class DriverSession:
+    """One warm browser plus the bookkeeping the pool needs"""
+
+    def __init__(self, driver, timeout):
+        self.driver = driver
+        self.wait = WebDriverWait(driver, timeout)
+        self.pages = 0
+        self.state = {}     # per-session flags, e.g. whether a popup was already dismissed
+
+    def healthy(self):
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+class DriverPool:
+    """
+    Bounded pool of warm WebDriver sessions for worker threads.
+
+    `factory()` builds a new driver and `warmup(session)` (optional) prepares
+    it once, e.g. loads a homepage and dismisses its popup. Sessions are
+    created lazily, health-checked on checkout, recycled after `max_pages`
+    uses and replaced if they crash. `name` labels the pool in run metrics.
+    """
+
+    def __init__(self, factory, size=4, max_pages=50, timeout=15, warmup=None, name="browser"):
+        self.factory = factory
+        self.name = name
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.warmup = warmup
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._all = set()
+        self._lock = threading.Lock()
+
+    def resize(self, size):
+        """Change the session bound; only valid before the first checkout"""
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _create(self):
+        with metrics.phase("driver-startup", self.name):
+            session = DriverSession(self.factory(), self.timeout)
+        with self._lock:
+            self._all.add(session)
+        if self.warmup:
+            try:
+                with metrics.phase("warmup", self.name):
+                    self.warmup(session)
+            except Exception as e:
+                logging.warning(f"Session warmup failed: {e}")
+        return session
+
+    def _retire(self, session):
+        with self._lock:
+            self._all.discard(session)
+        session.quit()
+
+    def _checkout(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    session = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._create()
+                if session.healthy():
+                    return session
+                logging.warning("Replacing crashed browser session")
+                metrics.count("driver-crash", self.name)
+                self._retire(session)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, session, failed):
+        try:
+            session.pages += 1
+            if session.pages >= self.max_pages or (failed and not session.healthy()):
+                self._retire(session)
+            else:
+                self._idle.put(session)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self):
+        """Check out a session for one unit of work; it returns to the pool afterwards"""
+        session = self._checkout()
+        failed = False
+        try:
+            yield session
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._checkin(session, failed)
+
+    def close(self):
+        """Quit every browser; the pool starts fresh sessions if it is used again"""
+        with self._lock:
+            sessions = list(self._all)
+            self._all.clear()
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        for session in sessions:
+            session.quit()
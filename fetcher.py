@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from functools import partial
+
+import aiohttp
+
+from browser_profile import use_profile
+from metrics import metrics
+from page_cache import CacheMiss
+from rate_limit import scheduler
+from retry import retry_policy, Blocked
+from waits import waiter, domain_of
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Bot walls come back as 200s, so look at the body too
+BLOCK_MARKERS = (
+    "enter the characters you see below",
+    "api-services-support@amazon.com",
+    "to discuss automated access to amazon data",
+    "unusual traffic",
+    "/errors/validatecaptcha",
+)
+
+def looks_blocked(html):
+    text = html[:20000].lower()
+    return any(marker in text for marker in BLOCK_MARKERS)
+
+class TieredFetcher:
+    """
+    Fetch pages cheapest-first: page cache, then a pooled asyncio HTTP client,
+    and only when the server HTML is missing, blocked or fails `accept(html)`
+    a Selenium session from `pool` (or a custom `browser()` loader).
+
+    Every method returns (html, tier) with tier in {'cache', 'http',
+    'browser'}, or (None, None) when all tiers failed.
+    """
+
+    def __init__(self, cache=None, pool=None, concurrency=32, per_host=8, timeout=20):
+        self.cache = cache
+        self.pool = pool
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self._session = None
+        self._slots = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host,
+                                         ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(
+            connector=connector, headers=HEADERS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._slots = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def http_get(self, url):
+        """
+        Plain GET; None on network errors, non-200 answers or bot walls.
+        Blocks only slow the scheduler down here: the circuit breaker counts
+        them once, through the retry policy, if the lookup ends in Blocked.
+        """
+        async with self._slots, scheduler.aslot(url):
+            try:
+                with metrics.phase("http", domain_of(url)):
+                    async with self._session.get(url) as resp:
+                        if resp.status != 200:
+                            logging.info(f"     HTTP {resp.status} for {url}")
+                            metrics.count(f"http-{resp.status}", domain_of(url))
+                            if resp.status in (403, 429, 503):
+                                scheduler.feedback(url, blocked=True, retry_after=resp.headers.get("Retry-After"))
+                            return None
+                        html = await resp.text(errors="replace")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.info(f"     HTTP failed for {url}: {e!r}")
+                metrics.count("http-error", domain_of(url))
+                return None
+        if looks_blocked(html):
+            logging.info(f"     Bot wall on {url}")
+            metrics.count("blocked", domain_of(url))
+            scheduler.feedback(url, blocked=True)
+            return None
+        scheduler.feedback(url)
+        retry_policy.breaker.success(domain_of(url))
+        return html
+
+    def browser_get(self, url):
+        """Selenium fallback: load the URL in a pooled session and return page_source"""
+        with self.pool.session() as s, scheduler.slot(url):
+            use_profile(s, url)
+            with metrics.phase("navigation", domain_of(url)):
+                s.driver.get(url)
+            waiter.page_ready(s.driver)
+            html = s.driver.page_source
+        blocked = looks_blocked(html)
+        scheduler.feedback(url, blocked=blocked)
+        if blocked:
+            # Raised so the bot wall isn't cached; the retry policy decides what's next
+            raise Blocked(f"bot wall on {url}")
+        return html
+
+    async def fetch(self, kind, key, url, accept=None, browser=None):
+        """
+        Fetch one page. `kind`/`key` address the page cache (e.g. "amazon",
+        href); `browser` overrides the Selenium fallback for pages that need
+        interaction, and browser=False disables the fallback.
+        """
+        if self.cache is not None:
+            html = self.cache.get(kind, key)
+            if html is not None:
+                metrics.count("page", "cache")
+                return html, "cache"
+            if self.cache.offline:
+                raise CacheMiss(f"{kind}:{key}")
+
+        html = await self.http_get(url) if url else None
+        if html is not None and (accept is None or accept(html)):
+            tier = "http"
+        elif browser is False or (browser is None and self.pool is None):
+            return None, None
+        else:
+            metrics.count("browser-fallback", kind)
+            html = await asyncio.to_thread(browser or partial(self.browser_get, url))
+            tier = "browser"
+
+        if html is not None:
+            metrics.count("page", tier)
+        if self.cache is not None and html is not None:
+            self.cache.put(kind, key, html)
+        return (html, tier) if html is not None else (None, None)
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# JSONL trace of every phase/outcome; empty string turns it off
+TRACE_PATH = os.environ.get("SCRAPER_TRACE", "scraper_trace.jsonl")
+# Optional Prometheus textfile-collector output written by report()
+TEXTFILE_PATH = os.environ.get("SCRAPER_METRICS_TEXTFILE", "")
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class RunMetrics:
+    """
+    Timings and counters for one scraper run, shared by every module.
+
+    phase() times a unit of work ('driver-startup', 'search', 'navigation',
+    'wait', 'extraction', 'http', ...) per source; count() bumps counters
+    such as pages and retries; outcome() records whether a source found a
+    weight and under which Detection Method. Everything is appended to a
+    JSONL trace as it happens; report() logs the end-of-run summary.
+    """
+
+    def __init__(self, trace_path=TRACE_PATH, textfile=TEXTFILE_PATH):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.trace_path = trace_path
+        self.textfile = textfile
+        self._lock = threading.Lock()
+        self._trace = None
+        self._phases = defaultdict(list)        # (phase, source) → [seconds]
+        self._failures = defaultdict(int)       # (phase, source) → failed phases
+        self._counters = defaultdict(int)       # (name, source) → n
+        self._outcomes = defaultdict(lambda: [0, 0])   # source → [found, tried]
+        self._methods = defaultdict(int)        # Detection Method → rows
+
+    def _emit(self, record):
+        if not self.trace_path:
+            return
+        record = {"run": self.run_id, "t": round(time.time(), 3), **record}
+        with self._lock:
+            if self._trace is None:
+                self._trace = open(self.trace_path, "a", encoding="utf-8", buffering=1)
+            self._trace.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    @contextmanager
+    def phase(self, name, source=None):
+        """Time the enclosed block as one `name` phase for `source`"""
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._phases[(name, source)].append(seconds)
+                if not ok:
+                    self._failures[(name, source)] += 1
+            self._emit({"event": "phase", "phase": name, "source": source,
+                        "ms": round(seconds * 1000, 2), "ok": ok})
+
+    def count(self, name, source=None, n=1):
+        """Bump a counter, e.g. count('page', 'http') or count('retry', 'mi.com')"""
+        with self._lock:
+            self._counters[(name, source)] += n
+        self._emit({"event": "count", "name": name, "source": source, "n": n})
+
+    def outcome(self, source, found, method=None, product=None):
+        """One product finished by `source`; feeds hit rates per source and per Detection Method"""
+        with self._lock:
+            stats = self._outcomes[source]
+            stats[1] += 1
+            if found:
+                stats[0] += 1
+                self._methods[method or source] += 1
+        self._emit({"event": "outcome", "source": source, "found": bool(found),
+                    "method": method, "product": product})
+
+    # ── Summary ────────────────────────────────────────────────────────────────
+    def summary(self):
+        with self._lock:
+            elapsed = time.time() - self.started
+            phases = {}
+            for (name, source), samples in self._phases.items():
+                ordered = sorted(samples)
+                phases[f"{name}/{source or '-'}"] = {
+                    "count": len(ordered),
+                    "failed": self._failures[(name, source)],
+                    "total_s": round(sum(ordered), 3),
+                    "mean_ms": round(sum(ordered) / len(ordered) * 1000, 1),
+                    "p50_ms": round(_percentile(ordered, 0.5) * 1000, 1),
+                    "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+                }
+            counters = {f"{name}/{source or '-'}": n for (name, source), n in self._counters.items()}
+            pages = sum(n for (name, _), n in self._counters.items() if name == "page")
+            sources = {source: {"found": found, "tried": tried, "hit_rate": round(found / tried, 3)}
+                       for source, (found, tried) in self._outcomes.items()}
+            return {
+                "run": self.run_id,
+                "elapsed_s": round(elapsed, 1),
+                "pages": pages,
+                "pages_per_sec": round(pages / elapsed, 3) if elapsed else 0.0,
+                "phases": phases,
+                "counters": counters,
+                "sources": sources,
+                "methods": dict(self._methods),
+            }
+
+    def report(self, title="run", out=logging.info):
+        """Log the end-of-run summary (print-based scripts pass out=print), trace it and write the textfile"""
+        s = self.summary()
+        out(f"── {title} metrics: {s['elapsed_s']}s, {s['pages']} pages ({s['pages_per_sec']}/s)")
+        for key, p in sorted(s["phases"].items(), key=lambda kv: -kv[1]["total_s"]):
+            out(f"   {key:<28} n={p['count']:<6} total {p['total_s']:>8.1f}s  "
+                f"p50 {p['p50_ms']:>8.1f}ms  p95 {p['p95_ms']:>8.1f}ms  failed {p['failed']}")
+        for key, n in sorted(s["counters"].items()):
+            out(f"   {key:<28} {n}")
+        for source, o in s["sources"].items():
+            out(f"   hit rate {source:<19} {o['found']}/{o['tried']} ({o['hit_rate']:.0%})")
+        for method, n in sorted(s["methods"].items(), key=lambda kv: -kv[1]):
+            out(f"   method {method:<21} {n}")
+        self._emit({"event": "summary", "title": title, **s})
+        if self.textfile:
+            self.write_textfile(s)
+        return s
+
+    def write_textfile(self, s):
+        """Prometheus textfile-collector format, written atomically"""
+        lines = [
+            f"scraper_elapsed_seconds {s['elapsed_s']}",
+            f"scraper_pages_total {s['pages']}",
+        ]
+        for key, p in s["phases"].items():
+            name, source = key.split("/", 1)
+            labels = f'phase="{_label(name)}",source="{_label(source)}"'
+            lines += [
+                f"scraper_phase_seconds_total{{{labels}}} {p['total_s']}",
+                f"scraper_phase_count{{{labels}}} {p['count']}",
+                f"scraper_phase_p95_seconds{{{labels}}} {p['p95_ms'] / 1000}",
+                f"scraper_phase_failed_total{{{labels}}} {p['failed']}",
+            ]
+        for key, n in s["counters"].items():
+            name, source = key.split("/", 1)
+            lines.append(f'scraper_events_total{{event="{_label(name)}",source="{_label(source)}"}} {n}')
+        for source, o in s["sources"].items():
+            lines.append(f'scraper_lookups_total{{source="{_label(source)}"}} {o["tried"]}')
+            lines.append(f'scraper_lookups_found_total{{source="{_label(source)}"}} {o["found"]}')
+        for method, n in s["methods"].items():
+            lines.append(f'scraper_rows_by_method_total{{method="{_label(method)}"}} {n}')
+        tmp = self.textfile + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, self.textfile)
+
+# Shared by every scraper in the process
+metrics = RunMetrics()
@@ -0,0 +1,285 @@
+import time
+import zlib
+import random
+import socket
+import asyncio
+import argparse
+import threading
+from html import escape
+from typing import NamedTuple
+from collections import defaultdict
+from urllib.parse import quote
+
+from aiohttp import web
+
+from url_index import slug
+
+# Stand-ins for DuckDuckGo, Amazon and mi.com, served under the real host
+# name as the first path segment ('/www.mi.com/global/' etc.), which is the
+# layout sites.site_url() produces when SCRAPER_SITE_BASE points here.
+
+class MockConfig(NamedTuple):
+    latency_ms: float = 100.0   # mean added delay per request
+    jitter_ms: float = 50.0     # standard deviation of that delay
+    error_rate: float = 0.0     # share of requests answered with HTTP 500
+    block_rate: float = 0.0     # share answered with a bot wall (Amazon, DuckDuckGo) or 429 (mi.com)
+    rate: float = 0.0           # requests per second per host before 429s; 0 = unlimited
+    popup_rate: float = 0.5     # share of mi.com home pages showing the shortcut pop-up
+
+# ── 1. Catalogue ───────────────────────────────────────────────────────────────
+# Every product exists; its weight and page layout follow from a hash of its
+# slug, so the harness knows the right answer without a product list.
+def _hash(key, salt=""):
+    return zlib.crc32(f"{salt}:{key}".encode("utf-8"))
+
+def expected_grams(name):
+    """Weight the mock sites give for a product, or None for the ~10% they don't list"""
+    return _weight(slug(name))
+
+def _weight(key):
+    h = _hash(key)
+    return None if h % 10 == 0 else float(50 + h % 4950)
+
+AMAZON_UNITS = (("Grams", 1.0), ("Kilograms", 1000.0), ("Pounds", 453.592), ("Ounces", 28.3495))
+
+def _amazon_weight(grams, key):
+    unit, factor = AMAZON_UNITS[_hash(key, "unit") % len(AMAZON_UNITS)]
+    return f"{grams / factor:.2f} {unit}"
+
+def _page(title, body, head=""):
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{escape(title)}</title>{head}</head>"
+            f"<body>{body}</body></html>")
+
+# ── 2. Pages ───────────────────────────────────────────────────────────────────
+def ddg_results(base, query, js=False):
+    """DuckDuckGo results: the HTML endpoint wraps links in /l/?uddg=, the JS page doesn't"""
+    product = query[:-len(" amazon")] if query.lower().endswith(" amazon") else query
+    key = slug(product)
+    target = f"{base}/www.amazon.com/{key}/dp/B0{_hash(key) % 10**8:08d}"
+    links = [(f"{product} - Xiaomi Global", f"{base}/www.mi.com/global/product/{key}/"),
+             (f"Amazon.com: {product}", target)]
+    items = []
+    for title, href in links:
+        if js:
+            items.append(f"<article><h2><a data-testid='result-title-a' href='{escape(href)}'>"
+                         f"{escape(title)}</a></h2></article>")
+        else:
+            wrapped = f"//duckduckgo.com/l/?uddg={quote(href, safe='')}"
+            items.append(f"<div class='result'><h2><a class='result__a' href='{escape(wrapped)}'>"
+                         f"{escape(title)}</a></h2></div>")
+    return _page(f"{query} at DuckDuckGo", "".join(items))
+
+def amazon_product(key):
+    """Detail page in one of Amazon's two layouts (table or bullet list)"""
+    grams = _weight(key)
+    rows = [("Product Dimensions", "10 x 5 x 3 cm"), ("Manufacturer", "Xiaomi")]
+    if grams is not None:
+        rows.insert(1, ("Item Weight", _amazon_weight(grams, key)))
+    if _hash(key, "layout") % 2:
+        cells = "".join(f"<tr><th class='prodDetSectionEntry'>{k}</th><td>\u200e{v}</td></tr>" for k, v in rows)
+        details = f"<table id='productDetails_detailBullets_sections1'>{cells}</table>"
+    else:
+        bullets = "".join(f"<li><span><span class='a-text-bold'>{k} \u200f:\u200e </span><span>{v}</span></span></li>"
+                          for k, v in rows)
+        details = f"<div id='detailBullets_feature_div'><ul>{bullets}</ul></div>"
+    return _page(f"Amazon.com: {key}", f"<h1 id='title'>{escape(key)}</h1>{details}")
+
+AMAZON_BOT_WALL = _page("Robot Check", "<h4>Enter the characters you see below</h4>"
+                                       "<form action='/errors/validateCaptcha'></form>")
+DDG_BOT_WALL = _page("DuckDuckGo", "<p>Unusual traffic from your network.</p>")
+
+def _mi_header(base, popup):
+    search = f"{base}/www.mi.com/global/search/?keyword="
+    shortcut = ("<div class='shortcut__item--wrapper' onclick='this.remove()'"
+                " style='position:fixed;top:0;left:0;right:0;padding:20px;background:#fff'>Shortcuts</div>"
+                if popup else "")
+    return (f"<header><input id='mi-base-search' type='search' placeholder='Search'"
+            f" onkeydown=\"if (event.key === 'Enter') location.href = '{search}' + encodeURIComponent(this.value)\">"
+            f"</header>{shortcut}")
+
+def mi_home(base, popup):
+    return _page("Xiaomi Global", _mi_header(base, popup) + "<main><h1>Xiaomi</h1></main>")
+
+def mi_search(base, keyword):
+    """Search results with Products and Support tabs; support results show after the tab is clicked"""
+    product = keyword[:-len(" weight")] if keyword.lower().endswith(" weight") else keyword
+    key = slug(product)
+    grams = _weight(key)
+    # About half the support previews quote the weight; the rest need the article
+    preview = f"Weight: {grams:g} g" if grams is not None and _hash(key, "preview") % 2 else "User guide and FAQ"
+    tabs = ("<ul class='search-tabs'>"
+            "<li class='search-tabs--item' data-tab-type='product'>Products</li>"
+            "<li class='search-tabs--item' data-tab-type='support'"
+            " onclick=\"document.getElementById('support').style.display = 'block'\">Support</li></ul>")
+    products = (f"<div id='products'><a class='product-result-item' href='{base}/www.mi.com/global/product/{key}/'>"
+                f"{escape(product)}</a></div>")
+    support = (f"<div id='support' style='display:none'><div class='support-result-item__left'>"
+               f"<a class='support-result-item__left--link' href='{base}/www.mi.com/global/support/article/{key}/'>"
+               f"{escape(product)} specifications</a><p>{preview}</p></div></div>")
+    return _page(f"{keyword} - Search", _mi_header(base, False) + tabs + products + support)
+
+def mi_product(base, key):
+    return _page(key, _mi_header(base, False) +
+                 f"<nav><a id='nav-specs' href='{base}/www.mi.com/global/product/{key}/specs/'>Specs</a></nav>")
+
+def mi_specs(base, key):
+    grams = _weight(key)
+    specs = ["Dimensions: 120 × 60 × 30 mm", "Rated power: 10 W"]
+    if grams is not None:
+        specs.insert(1, f"Net weight: {grams:g} g" if grams < 1000 else f"Net weight: {grams / 1000:g} kg")
+    spans = "".join(f"<li><span class='xm-text'>{escape(s)}</span></li>" for s in specs)
+    return _page(f"{key} specs", _mi_header(base, False) + f"<ul class='specs'>{spans}</ul>")
+
+def mi_support_article(base, key):
+    grams = _weight(key)
+    detail = f"<p>Weight: {grams:g} g</p>" if grams is not None else "<p>See the user manual.</p>"
+    return _page(f"{key} support", _mi_header(base, False) + f"<article><h1>{escape(key)}</h1>{detail}</article>")
+
+# ── 3. Server ──────────────────────────────────────────────────────────────────
+class MockSites:
+    """
+    The mock sites as one aiohttp app, with latency, errors, bot walls and
+    per-host rate limits injected according to `config`. start() serves it
+    from a background thread; stats() reports what every host answered.
+    """
+
+    def __init__(self, config=MockConfig(), seed=None):
+        self.config = config
+        self.random = random.Random(seed)
+        self.base = ""
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._buckets = {}
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def stats(self):
+        return {host: dict(counts) for host, counts in self._stats.items()}
+
+    def reset(self):
+        self._stats.clear()
+        self._buckets.clear()
+
+    def _allow(self, host):
+        """Per-host token bucket; False when the request should get a 429"""
+        rate = self.config.rate
+        if not rate:
+            return True
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(host, (max(1.0, rate), now))
+        tokens = min(max(1.0, rate), tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        self._buckets[host] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    async def _serve(self, request):
+        host, _, path = request.match_info["tail"].partition("/")
+        path = "/" + path
+        stats = self._stats[host]
+        stats["requests"] += 1
+        cfg = self.config
+
+        delay = max(0.0, self.random.gauss(cfg.latency_ms, cfg.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        if not self._allow(host):
+            stats["rate-limited"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"}, text="Too Many Requests")
+        roll = self.random.random()
+        if roll < cfg.error_rate:
+            stats["errors"] += 1
+            return web.Response(status=500, text="Internal Server Error")
+        if roll < cfg.error_rate + cfg.block_rate:
+            stats["blocked"] += 1
+            if host.endswith("amazon.com"):
+                return web.Response(text=AMAZON_BOT_WALL, content_type="text/html")
+            if host.endswith("duckduckgo.com"):
+                return web.Response(text=DDG_BOT_WALL, content_type="text/html")
+            return web.Response(status=429, headers={"Retry-After": "1"}, text="Too Many Requests")
+
+        html = self._route(host, path, request.query)
+        if html is None:
+            stats["not-found"] += 1
+            raise web.HTTPNotFound()
+        stats["ok"] += 1
+        return web.Response(text=html, content_type="text/html")
+
+    def _route(self, host, path, query):
+        parts = [p for p in path.split("/") if p]
+        if host == "html.duckduckgo.com" and parts[:1] == ["html"]:
+            return ddg_results(self.base, query.get("q", ""))
+        if host == "duckduckgo.com" and not parts:
+            return ddg_results(self.base, query.get("q", ""), js=True)
+        if host == "www.amazon.com" and len(parts) == 3 and parts[1] == "dp":
+            return amazon_product(parts[0])
+        if host == "www.mi.com" and parts[:1] == ["global"]:
+            rest = parts[1:]
+            if not rest:
+                return mi_home(self.base, self.random.random() < self.config.popup_rate)
+            if rest == ["search"]:
+                return mi_search(self.base, query.get("keyword", ""))
+            if len(rest) == 2 and rest[0] == "product":
+                return mi_product(self.base, rest[1])
+            if len(rest) == 3 and rest[0] == "product" and rest[2] == "specs":
+                return mi_specs(self.base, rest[1])
+            if len(rest) == 3 and rest[:2] == ["support", "article"]:
+                return mi_support_article(self.base, rest[2])
+        return None
+
+    async def _stats_handler(self, request):
+        return web.json_response(self.stats())
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/__stats", self._stats_handler)
+        app.router.add_get("/{tail:.*}", self._serve)
+        return app
+
+    # ── Background thread ──────────────────────────────────────────────────────
+    def start(self, host="127.0.0.1", port=0):
+        """Serve from a daemon thread; returns the base URL for SCRAPER_SITE_BASE"""
+        ready = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.app(), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            sock = socket.socket()
+            sock.bind((host, port))
+            self._loop.run_until_complete(web.SockSite(self._runner, sock).start())
+            self.base = f"http://{host}:{sock.getsockname()[1]}"
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name="mock-sites", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.base
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock DuckDuckGo, Amazon and mi.com pages")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=100.0, help="mean added latency in ms")
+    parser.add_argument("--jitter", type=float, default=50.0, help="latency standard deviation in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500 answers")
+    parser.add_argument("--block-rate", type=float, default=0.0, help="share of bot walls / 429s")
+    parser.add_argument("--rate", type=float, default=0.0, help="requests/s per host before 429s (0 = off)")
+    parser.add_argument("--popup-rate", type=float, default=0.5)
+    args = parser.parse_args()
+
+    sites = MockSites(MockConfig(args.latency, args.jitter, args.error_rate, args.block_rate,
+                                 args.rate, args.popup_rate))
+    sites.base = f"http://127.0.0.1:{args.port}"
+    print(f"🧪 Mock sites on {sites.base}; run scrapers with SCRAPER_SITE_BASE={sites.base}")
+    web.run_app(sites.app(), host="127.0.0.1", port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
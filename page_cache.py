@@ -0,0 +1,133 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import logging
+
+# ── 1. Settings (overridable per run through the environment) ─────────────────
+CACHE_PATH   = os.environ.get("SCRAPER_CACHE_PATH", "page_cache.sqlite")
+CACHE_TTL    = float(os.environ.get("SCRAPER_CACHE_TTL", 7 * 24 * 3600))   # seconds, 0 = never expires
+CACHE_MAX_MB = float(os.environ.get("SCRAPER_CACHE_MAX_MB", 1024))
+CACHE_ONLY   = os.environ.get("SCRAPER_CACHE_ONLY", "") not in ("", "0", "false")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    body   BLOB NOT NULL,
+    size   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    key         TEXT PRIMARY KEY,
+    label       TEXT NOT NULL,
+    digest      TEXT NOT NULL REFERENCES blobs(digest),
+    fetched_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages(accessed_at);
+"""
+
+class CacheMiss(Exception):
+    """Raised in cache-only mode when a page was never fetched"""
+
+# ── 2. Content-addressed page store ────────────────────────────────────────────
+class PageCache:
+    """
+    SQLite page cache. Keys are (kind, url-or-query) pairs; bodies are stored
+    once per content hash, zlib-compressed, so identical pages share storage.
+    Entries expire after `ttl` seconds and the least recently read pages are
+    evicted once the store grows past `max_mb`.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_mb=CACHE_MAX_MB, offline=CACHE_ONLY):
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        # Stored (compressed) bytes, kept up to date by put() so writes don't rescan the table
+        (self._size,) = self._db.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM blobs").fetchone()
+
+    @staticmethod
+    def key(kind, value):
+        label = f"{kind}:{' '.join(str(value).split()).lower()}"
+        return hashlib.sha256(label.encode("utf-8")).hexdigest(), label
+
+    def get(self, kind, value):
+        """Cached text for (kind, value), or None if missing or expired"""
+        key, _ = self.key(kind, value)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT b.body, p.fetched_at FROM pages p JOIN blobs b ON b.digest = p.digest WHERE p.key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            body, fetched_at = row
+            if self.ttl and time.time() - fetched_at > self.ttl and not self.offline:
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(body).decode("utf-8")
+
+    def put(self, kind, value, text):
+        if text is None:
+            return
+        key, label = self.key(kind, value)
+        raw = text.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        now = time.time()
+        body = zlib.compress(raw, 6)
+        with self._lock:
+            self._db.execute("BEGIN")
+            stored = self._db.execute(
+                "INSERT OR IGNORE INTO blobs(digest, body, size) VALUES (?, ?, ?)",
+                (digest, body, len(raw))
+            ).rowcount
+            self._size += len(body) if stored > 0 else 0
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages(key, label, digest, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, label, digest, now, now)
+            )
+            self._db.execute("COMMIT")
+            self._evict()
+
+    def fetch(self, kind, value, loader):
+        """
+        Return the cached text for (kind, value); on a miss call loader() and
+        store its result. In cache-only mode a miss raises CacheMiss instead
+        of touching the network.
+        """
+        text = self.get(kind, value)
+        if text is not None:
+            logging.debug(f"cache hit {kind}:{value}")
+            return text
+        if self.offline:
+            raise CacheMiss(f"{kind}:{value}")
+        text = loader()
+        self.put(kind, value, text)
+        return text
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        self._db.execute("BEGIN")
+        # Exact figures here (eviction is rare): a shared blob is freed once, with its last page
+        sizes = dict(self._db.execute("SELECT digest, LENGTH(body) FROM blobs"))
+        refs = dict(self._db.execute("SELECT digest, COUNT(*) FROM pages GROUP BY digest"))
+        total = sum(sizes[digest] for digest in refs)   # unreferenced blobs are dropped below
+        for key, digest in self._db.execute("SELECT key, digest FROM pages ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes * 0.9:
+                break
+            self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            refs[digest] -= 1
+            if refs[digest] == 0:
+                total -= sizes[digest]
+        self._db.execute("DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM pages)")
+        self._db.execute("COMMIT")
+        self._size = total
+
+    def close(self):
+        self._db.close()
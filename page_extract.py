@@ -0,0 +1,120 @@
+from urllib.parse import urlparse, parse_qs
+
+import lxml.html
+
+# Block-level tags whose boundaries become line breaks, like a browser's innerText
+BLOCK_TAGS = ("p", "div", "br", "li", "tr", "td", "th", "h1", "h2", "h3",
+              "h4", "h5", "h6", "ul", "ol", "table", "section", "article")
+
+DIRECTION_MARKS = str.maketrans("", "", "\u200e\u200f")
+
+# ── 1. Parsing helpers ─────────────────────────────────────────────────────────
+def parse_html(html):
+    """Parse an HTML string with scripts/styles removed, or None if unusable"""
+    if not isinstance(html, str) or not html.strip():
+        return None
+    try:
+        root = lxml.html.fromstring(html)
+    except Exception:
+        return None
+    for bad in root.xpath("//script | //style | //noscript"):
+        bad.drop_tree()
+    return root
+
+def visible_text(el):
+    """Approximate Selenium's .text: block boundaries become newlines"""
+    if el is None:
+        return ""
+    for block in el.iter(*BLOCK_TAGS):
+        block.tail = "\n" + (block.tail or "")
+    return el.text_content()
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+def _text(el):
+    # Amazon pads detail cells with invisible direction marks
+    return " ".join(el.text_content().translate(DIRECTION_MARKS).split())
+
+# Live pages (the *_live extractors): everything is collected in one
+# execute_script round trip and returned in the same plain structure as the
+# HTML path, so the Python matching logic is shared.
+JS_CLEAN = r"""
+const clean = s => (s || "").replace(/[\u200e\u200f]/g, "").replace(/\s+/g, " ").trim();
+"""
+
+def _run(driver, script):
+    return driver.execute_script(JS_CLEAN + script) or []
+
+# ── 2. DuckDuckGo ──────────────────────────────────────────────────────────────
+def ddg_amazon_link(html):
+    """First amazon.com result link on a DuckDuckGo results page"""
+    root = parse_html(html)
+    if root is None:
+        return None
+    for a in root.xpath(f"//a[{_has_class('result__a')} or @data-testid='result-title-a']"):
+        href = a.get("href") or ""
+        # The HTML endpoint wraps results in //duckduckgo.com/l/?uddg=<target>
+        target = parse_qs(urlparse(href).query).get("uddg")
+        if target:
+            href = target[0]
+        if "amazon.com" in href.lower():
+            return href
+    return None
+
+# ── 3. Amazon product details ──────────────────────────────────────────────────
+def amazon_weight_candidates(html):
+    """(key, value) pairs mentioning weight from both Amazon detail layouts"""
+    root = parse_html(html)
+    if root is None:
+        return []
+    candidates = []
+
+    # 1) Table-based details
+    for row in root.xpath("//*[@id='productDetails_detailBullets_sections1']//tr"):
+        th, td = row.find(".//th"), row.find(".//td")
+        if th is None or td is None:
+            continue
+        key, val = _text(th), _text(td)
+        if "weight" in key.lower():
+            candidates.append((key, val))
+
+    # 2) Bullet-list details
+    for li in root.xpath("//*[@id='detailBullets_feature_div']//li"):
+        parts = _text(li).split(":", 1)
+        if len(parts) == 2:
+            key, val = parts[0].strip(), parts[1].strip()
+            if "weight" in key.lower():
+                candidates.append((key, val))
+    return candidates
+
+# ── 4. mi.com ──────────────────────────────────────────────────────────────────
+MI_SPEC_TEXTS_JS = r"""
+return Array.from(document.querySelectorAll("span.xm-text"), el => clean(el.textContent));
+"""
+
+def mi_spec_texts(html):
+    """Texts of the spec spans on a mi.com Specs tab"""
+    root = parse_html(html)
+    if root is None:
+        return []
+    return [_text(el) for el in root.xpath(f"//span[{_has_class('xm-text')}]")]
+
+def mi_spec_texts_live(driver):
+    """mi_spec_texts() of the page a WebDriver has open, in one round trip"""
+    return _run(driver, MI_SPEC_TEXTS_JS)
+
+def mi_support_preview(html):
+    """Joined preview text of the mi.com support search results"""
+    root = parse_html(html)
+    if root is None:
+        return ""
+    return " ".join(_text(el) for el in root.xpath(f"//div[{_has_class('support-result-item__left')}]"))
+
+def body_text(html):
+    """Visible text of a whole page"""
+    root = parse_html(html)
+    if root is None:
+        return ""
+    body = root.find(".//body")
+    return visible_text(body if body is not None else root)
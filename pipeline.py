@@ -0,0 +1,407 @@
+import asyncio
+import logging
+import argparse
+import threading
+
+import pandas as pd
+
+from metrics import metrics
+from page_cache import CacheMiss
+from result_store import ResultStore
+from retry import retry_policy, Cancelled
+from stage_data import read_dataset, write_dataset, export_excel
+from variants import families, representatives, fan_out
+from weight_kb import weight_kb
+from weight_units import to_grams
+
+# Logging setup
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)8s | %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+
+# ── 1. Stages ──────────────────────────────────────────────────────────────────
+# Each stage resolves one product (name and Model Number) to (grams, method, source) or None.
+# Scraper modules are imported lazily so unused stages cost nothing at startup.
+
+class Stage:
+    def __init__(self, name, workers, lookup, setup=None, teardown=None, paid=False):
+        self.name = name
+        self.workers = workers
+        # async (row index, product, model, cancelled=None) → (grams, method, source) | None;
+        # `cancelled` is a threading.Event the hedged mode sets for lookups that lost
+        self.lookup = lookup
+        self.setup = setup          # async () → None, before the first lookup
+        self.teardown = teardown    # async () → None, after the run
+        self.paid = paid            # billed per call: hedged mode only asks it when free stages can't answer
+
+def amazon_stage(workers):
+    import amazonScrappar
+    from fetcher import TieredFetcher
+    fetcher = TieredFetcher(cache=amazonScrappar.cache, pool=amazonScrappar.pool,
+                            concurrency=amazonScrappar.HTTP_CONCURRENCY,
+                            per_host=amazonScrappar.HTTP_PER_HOST)
+
+    async def lookup(idx, product, model="", cancelled=None):
+        where = {"url": None}
+        grams, source, url = await retry_policy.run(
+            lambda: amazonScrappar.lookup(fetcher, product, where, model, cancelled), lambda: where["url"])
+        if grams is None:
+            return None
+        return grams, f"ddg→amazon({source})", url
+
+    async def setup():
+        await fetcher.__aenter__()
+
+    async def teardown():
+        await fetcher.__aexit__(None, None, None)
+        amazonScrappar.pool.close()
+
+    return Stage("amazon", workers, lookup, setup, teardown)
+
+def mi_specs_stage(workers):
+    import scrapperForWeight
+    scrapperForWeight.pool.resize(workers)
+
+    async def lookup(idx, product, model="", cancelled=None):
+        grams, _ = await asyncio.to_thread(
+            retry_policy.call, lambda: scrapperForWeight.lookup_specs(product, model, cancelled), "mi.com",
+            cancelled)
+        if grams is None:
+            return None
+        return grams, "scraper", "mi.com/specs"
+
+    async def teardown():
+        scrapperForWeight.pool.close()
+
+    return Stage("mi-specs", workers, lookup, teardown=teardown)
+
+def mi_support_stage(workers):
+    import scrapper_support
+    scrapper_support.pool.resize(workers)
+
+    async def lookup(idx, product, model="", cancelled=None):
+        _, val, unit, method = await asyncio.to_thread(
+            scrapper_support.process_row, idx, {"Product Name": product, "Model Number": model}, cancelled)
+        if val is None:
+            return None
+        return to_grams(val, unit), method, "mi.com/support"
+
+    async def teardown():
+        scrapper_support.pool.close()
+
+    return Stage("mi-support", workers, lookup, teardown=teardown)
+
+def llm_stage(workers):
+    import tempCodeRunnerFile
+
+    async def lookup(idx, product, model="", cancelled=None):
+        weight, method = await asyncio.to_thread(tempCodeRunnerFile.get_weight_from_gpt, product, model)
+        if not weight:
+            return None
+        return weight, method, "gpt-3.5-turbo"
+
+    return Stage("llm", workers, lookup, paid=True)
+
+STAGES = {
+    "amazon": amazon_stage,
+    "mi-specs": mi_specs_stage,
+    "mi-support": mi_support_stage,
+    "llm": llm_stage,
+}
+
+# ── 2. Streaming orchestrator ──────────────────────────────────────────────────
+class Pipeline:
+    """
+    Streams products through the stages in order. Every stage has its own
+    queue and worker count; a product leaves as soon as one stage resolves
+    it, and a miss moves it to the next stage right away instead of after
+    the whole batch.
+    """
+
+    def __init__(self, stages, store):
+        self.stages = stages
+        self.store = store
+        self.queues = [asyncio.Queue() for _ in stages]
+        self.pending = 0
+        self.finished = asyncio.Event()
+        self.stats = {stage.name: {"tried": 0, "resolved": 0, "errors": 0} for stage in stages}
+
+    def _finish(self, idx, product, result):
+        # Committed right away so an interrupted run can --resume
+        if result is None:
+            self.store.record(idx, product)
+        else:
+            grams, method, source = result
+            self.store.record(idx, product, grams, "g", method, source)
+        self.pending -= 1
+        if self.pending == 0:
+            self.finished.set()
+
+    async def _worker(self, position):
+        stage = self.stages[position]
+        inbox = self.queues[position]
+        stats = self.stats[stage.name]
+        while True:
+            idx, product, model = await inbox.get()
+            stats["tried"] += 1
+            try:
+                with metrics.phase("stage", stage.name):
+                    result = await stage.lookup(idx, product, model)
+            except CacheMiss:
+                result = None
+            except Exception as e:
+                logging.error(f"[{stage.name}] error for '{product}': {e}")
+                stats["errors"] += 1
+                result = None
+
+            metrics.outcome(stage.name, result is not None, result[1] if result else None, product)
+            if result is not None:
+                stats["resolved"] += 1
+                logging.info(f"[{stage.name}] '{product}' → {result[0]} g")
+                self._finish(idx, product, result)
+            elif position + 1 < len(self.stages):
+                self.queues[position + 1].put_nowait((idx, product, model))
+            else:
+                logging.warning(f"'{product}' unresolved after all stages")
+                self._finish(idx, product, None)
+
+    async def run(self, products):
+        """products: iterable of (row index, product name, model number)"""
+        for stage in self.stages:
+            if stage.setup:
+                await stage.setup()
+        workers = [
+            asyncio.create_task(self._worker(position))
+            for position, stage in enumerate(self.stages)
+            for _ in range(stage.workers)
+        ]
+        try:
+            for idx, product, model in products:
+                self.pending += 1
+                self.queues[0].put_nowait((idx, product, model))
+            if self.pending:
+                await self.finished.wait()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            for stage in self.stages:
+                if stage.teardown:
+                    await stage.teardown()
+        return self.stats
+
+# ── 3. Hedged orchestrator ─────────────────────────────────────────────────────
+# How much an answer from each source is trusted, before the threshold check.
+# Amazon's full-page regex fallback and the LLM are guesses next to a spec table.
+SOURCE_CONFIDENCE = {"amazon": 0.85, "mi-specs": 0.95, "mi-support": 0.8, "llm": 0.5}
+METHOD_CONFIDENCE = {"ddg→amazon(full_page_regex)": 0.6, "support-full": 0.7}
+
+def confidence(stage_name, method):
+    return METHOD_CONFIDENCE.get(method, SOURCE_CONFIDENCE.get(stage_name, 0.5))
+
+class HedgedPipeline:
+    """
+    Queries every free stage for a product at once instead of one after
+    another; paid stages (the LLM) are only asked when none of them found
+    anything. The first answer whose confidence reaches `threshold` is
+    accepted as soon as no higher-priority stage is still running (or after
+    waiting `grace` seconds for them), and the other lookups are cancelled.
+    If no answer reaches the threshold, the most confident one is kept, ties
+    going to the earlier stage. Lookups running in threads (the Selenium
+    stages) can't be interrupted by the event loop, so they also get a
+    flag, checked before and after waiting for a browser, that makes them
+    give up their session at the next step.
+    """
+
+    def __init__(self, stages, store, threshold=0.75, grace=10.0):
+        self.stages = stages
+        self.store = store
+        self.threshold = threshold
+        self.grace = grace
+        self.slots = [asyncio.Semaphore(stage.workers) for stage in stages]
+        self.stats = {stage.name: {"tried": 0, "resolved": 0, "errors": 0, "answered": 0, "cancelled": 0}
+                      for stage in stages}
+
+    async def _ask(self, position, idx, product, model, cancelled):
+        stage = self.stages[position]
+        stats = self.stats[stage.name]
+        async with self.slots[position]:
+            stats["tried"] += 1
+            try:
+                with metrics.phase("stage", stage.name):
+                    result = await stage.lookup(idx, product, model, cancelled)
+            except (CacheMiss, Cancelled):
+                return None
+            except Exception as e:
+                logging.error(f"[{stage.name}] error for '{product}': {e}")
+                stats["errors"] += 1
+                return None
+        if result is not None:
+            stats["answered"] += 1
+        return result
+
+    def _best(self, answers):
+        """Highest-confidence answer, earlier stage first on ties: (position, result, score) or None"""
+        ranked = [(score, -position, position, result) for position, (result, score) in answers.items()]
+        if not ranked:
+            return None
+        _, _, position, result = max(ranked, key=lambda item: item[:2])
+        return position, result, answers[position][1]
+
+    async def _resolve(self, idx, product, model):
+        cancelled = threading.Event()
+        tasks = {}
+
+        def launch(positions):
+            started = {asyncio.create_task(self._ask(position, idx, product, model, cancelled)): position
+                       for position in positions}
+            tasks.update(started)
+            return set(started)
+
+        free = [p for p, stage in enumerate(self.stages) if not stage.paid]
+        paid = [p for p, stage in enumerate(self.stages) if stage.paid]
+        running = launch(free or paid)
+        if not free:
+            paid = []
+        answers = {}
+        deadline = None
+        accepted = None
+        try:
+            while running:
+                timeout = None if deadline is None else max(0.0, deadline - asyncio.get_running_loop().time())
+                done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        position = tasks[task]
+                        answers[position] = (result, confidence(self.stages[position].name, result[1]))
+
+                good = [p for p, (_, score) in answers.items() if score >= self.threshold]
+                if good:
+                    first = min(good)
+                    still_ahead = [t for t in running if tasks[t] < first]
+                    if not still_ahead or not done:
+                        accepted = first
+                        break
+                    if deadline is None and self.grace:
+                        deadline = asyncio.get_running_loop().time() + self.grace
+                    elif not self.grace:
+                        accepted = first
+                        break
+                if not running and not answers and paid:
+                    running = launch(paid)
+                    paid = []
+        finally:
+            cancelled.set()
+            for task in running:
+                task.cancel()
+                self.stats[self.stages[tasks[task]].name]["cancelled"] += 1
+                metrics.count("hedge-cancelled", self.stages[tasks[task]].name)
+
+        if accepted is not None:
+            position, (result, score) = accepted, answers[accepted]
+        else:
+            best = self._best(answers)
+            if best is None:
+                logging.warning(f"'{product}' unresolved by every stage")
+                metrics.outcome("hedged", False, product=product)
+                self.store.record(idx, product)
+                return
+            position, result, score = best
+        stage = self.stages[position]
+        grams, method, source = result
+        self.stats[stage.name]["resolved"] += 1
+        metrics.outcome("hedged", True, method, product)
+        logging.info(f"[{stage.name}] '{product}' → {grams} g (confidence {score:.2f})")
+        self.store.record(idx, product, grams, "g", method, source)
+
+    async def run(self, products):
+        """products: iterable of (row index, product name, model number)"""
+        for stage in self.stages:
+            if stage.setup:
+                await stage.setup()
+        # As many products in flight as the widest stage has workers; the bounded
+        # queue makes the producer wait, so a large catalogue is never all in memory as tasks
+        width = max(stage.workers for stage in self.stages)
+        inbox = asyncio.Queue(maxsize=width)
+
+        async def worker():
+            while True:
+                idx, product, model = await inbox.get()
+                try:
+                    await self._resolve(idx, product, model)
+                except Exception as e:
+                    logging.error(f"'{product}' failed: {e!r}")
+                finally:
+                    inbox.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(width)]
+        try:
+            for item in products:
+                await inbox.put(item)
+            await inbox.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            for stage in self.stages:
+                if stage.teardown:
+                    await stage.teardown()
+        return self.stats
+
+# ── 4. Entry point ─────────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Resolve missing weights through every source in one streaming run")
+    parser.add_argument("--input", default="product_details",
+                        help="dataset name in the data directory, or an .xlsx path")
+    parser.add_argument("--output", default="pipeline_results.xlsx")
+    parser.add_argument("--stages", default="amazon,mi-specs,mi-support,llm",
+                        help="comma-separated, in cascade order")
+    parser.add_argument("--workers", default="amazon=16,mi-specs=2,mi-support=4,llm=4",
+                        help="per-stage concurrency, e.g. amazon=16,mi-support=4")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip rows already finished by an earlier, interrupted run")
+    parser.add_argument("--hedged", action="store_true",
+                        help="query all stages at once and keep the first confident answer")
+    parser.add_argument("--threshold", type=float, default=0.75,
+                        help="hedged mode: minimum confidence to accept an answer early")
+    parser.add_argument("--grace", type=float, default=10.0,
+                        help="hedged mode: seconds to wait for higher-priority stages after a confident answer")
+    args = parser.parse_args()
+
+    workers = dict(item.split("=") for item in args.workers.split(",") if item)
+    stages = [STAGES[name](int(workers.get(name, 1))) for name in args.stages.split(",") if name]
+    store = ResultStore("pipeline", resume=args.resume)
+
+    df = read_dataset(args.input)
+    # Products resolved by earlier runs are filled from the knowledge base, not looked up
+    known = weight_kb.fill(df)
+    # Colour/storage/region variants share a weight: resolve one row per family
+    family = families(df)
+    filled = fan_out(df, family)
+    todo = representatives(store.pending(df[df["Weight"] == 0]), family)
+    logging.info(f" {known} rows known from earlier runs, {filled} filled from variants; {len(todo)} family representatives to resolve")
+
+    if args.hedged:
+        runner = HedgedPipeline(stages, store, args.threshold, args.grace)
+    else:
+        runner = Pipeline(stages, store)
+    # Same blank-for-missing Model Number as the batch LLM path, so answer cache keys match
+    models = todo["Model Number"].fillna("") if "Model Number" in todo.columns else pd.Series("", index=todo.index)
+    products = [(idx, name, str(models[idx]).strip()) for idx, name in todo["Product Name"].items()]
+    stats = asyncio.run(runner.run(products))
+    for name, s in stats.items():
+        logging.info(f" {name:<10} tried {s['tried']:>5}  resolved {s['resolved']:>5}  errors {s['errors']:>4}")
+
+    store.apply(df)
+    fan_out(df, family)
+    weight_kb.learn(df, "pipeline_results")
+    write_dataset(df, "pipeline_results")
+    export_excel(df, args.output)
+    metrics.report("pipeline")
+    logging.info(f" Done! Saved as '{args.output}'.")
+
+if __name__ == "__main__":
+    main()
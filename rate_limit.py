@@ -0,0 +1,169 @@
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from waits import domain_of
+
+# domain → (requests per second, burst, max concurrent requests)
+DEFAULT_LIMITS = {
+    "duckduckgo.com": (1.0, 2, 2),
+    "amazon.com":     (2.0, 4, 4),
+    "mi.com":         (2.0, 4, 4),
+    "api.openai.com": (3.0, 6, 8),
+}
+FALLBACK_LIMIT = (2.0, 4, 4)
+
+class DomainLimit:
+    """Token bucket plus in-flight counter for one domain, with AIMD adaptation"""
+
+    def __init__(self, rate, burst, concurrency, min_rate=0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.half_open = False      # after a circuit-breaker pause: one probe request at a time
+        self.probe_since = None     # when the current probe was let through
+
+    def reserve(self, now):
+        """Take a token; returns how long the caller must wait before using it"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        delay = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(delay, self.paused_until - now)
+
+class DomainScheduler:
+    """
+    Shared per-domain pacing for every scraper in the process. Requests to
+    different domains never wait on each other; within a domain they are
+    held to the token-bucket rate and the concurrency cap. A 429, 503 or
+    bot wall reported through feedback() halves that domain's rate and
+    pauses it (honouring Retry-After); each success adds a little back.
+    A pause with probe=True (circuit breakers) is followed by a half-open
+    phase: one request goes through and the rest wait until settle() reports
+    how it went, or `probe_timeout` seconds pass without an answer.
+    """
+
+    def __init__(self, limits=None, recovery=0.05, probe_timeout=60.0):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self.recovery = recovery
+        self.probe_timeout = probe_timeout
+        self._domains = {}
+        self._cond = threading.Condition()
+
+    def _limit(self, target):
+        domain = domain_of(target) if "/" in target else target.lower()
+        for known in self.limits:
+            if domain == known or domain.endswith("." + known):
+                domain = known
+                break
+        limit = self._domains.get(domain)
+        if limit is None:
+            limit = self._domains[domain] = DomainLimit(*self.limits.get(domain, FALLBACK_LIMIT))
+        return domain, limit
+
+    def _try_enter(self, target):
+        """Claim a concurrency slot and a token; returns (limit, delay) or (None, None) if full"""
+        with self._cond:
+            _, limit = self._limit(target)
+            if limit.in_flight >= limit.concurrency:
+                return None, None
+            now = time.monotonic()
+            if limit.half_open:
+                if limit.probe_since is not None and now - limit.probe_since < self.probe_timeout:
+                    return None, None
+                limit.probe_since = now
+            limit.in_flight += 1
+            return limit, limit.reserve(now)
+
+    def _leave(self, limit):
+        with self._cond:
+            limit.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, target):
+        """Blocking: hold a request slot for `target` (URL or bare domain)"""
+        while True:
+            limit, delay = self._try_enter(target)
+            if limit is not None:
+                break
+            with self._cond:
+                self._cond.wait(0.5)
+        try:
+            if delay > 0:
+                time.sleep(delay)
+            yield
+        finally:
+            self._leave(limit)
+
+    @asynccontextmanager
+    async def aslot(self, target):
+        """asyncio flavour of slot(); shares the same limits"""
+        while True:
+            limit, delay = self._try_enter(target)
+            if limit is not None:
+                break
+            await asyncio.sleep(0.05)
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            self._leave(limit)
+
+    def feedback(self, target, blocked=False, retry_after=None):
+        """Report how a request went so the domain's pace can adapt"""
+        with self._cond:
+            domain, limit = self._limit(target)
+            if blocked:
+                limit.rate = max(limit.min_rate, limit.rate / 2)
+                try:
+                    pause = float(retry_after)
+                except (TypeError, ValueError):
+                    pause = 1 / limit.rate
+                limit.paused_until = max(limit.paused_until, time.monotonic() + pause)
+                logging.warning(f"Throttled by {domain}: now {limit.rate:.2f} req/s, pausing {pause:.1f}s")
+            else:
+                limit.rate = min(limit.max_rate, limit.rate + self.recovery)
+
+    def pause(self, target, seconds, probe=False):
+        """
+        Hold every request to the domain for `seconds` (e.g. while a circuit
+        breaker is open); with probe=True only one request at a time goes
+        through afterwards, until settle()
+        """
+        with self._cond:
+            _, limit = self._limit(target)
+            limit.paused_until = max(limit.paused_until, time.monotonic() + seconds)
+            if probe:
+                limit.half_open = True
+                limit.probe_since = None
+
+    def settle(self, target, closed):
+        """End the half-open probe: closed=True lets all requests through again, False admits the next probe"""
+        with self._cond:
+            _, limit = self._limit(target)
+            limit.probe_since = None
+            if closed:
+                limit.half_open = False
+            self._cond.notify_all()
+
+    def reset(self):
+        """Forget learned rates, pauses and in-flight counts, e.g. between benchmark runs"""
+        with self._cond:
+            self._domains.clear()
+
+    def rate(self, target):
+        with self._cond:
+            return self._limit(target)[1].rate
+
+# Shared by every scraper in the process
+scheduler = DomainScheduler()
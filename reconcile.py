@@ -0,0 +1,195 @@
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from metrics import metrics
+from result_store import read_results
+from stage_data import read_dataset, write_dataset, export_excel
+from variants import families, fan_out
+from weight_kb import weight_kb
+from weight_units import UNIT_ALIASES, UNIT_GRAMS
+from work_queue import read_queue_results
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)8s | %(message)s")
+
+# Highest first: hand-checked values and spec tables beat retail listings and guesses
+PRECEDENCE = ("manual", "mi-specs", "amazon", "mi-support", "kb", "extracted", "llm")
+# Sources further apart than this (max / min - 1) are flagged in 'Weight Conflict'
+TOLERANCE = 0.15
+
+# Weights already in the input dataset, by Detection Method prefix
+DATASET_SOURCES = {"extracted": "Automatic Extraction", "kb": "kb"}
+
+# pipeline.py stores all its answers as stage 'pipeline'; the Detection Method
+# tells which stage found each one (queue items already carry the stage name)
+PIPELINE_METHODS = {"ddg→amazon": "amazon", "scraper": "mi-specs", "support": "mi-support", "API": "llm"}
+
+# ── 1. Sources → one long table (row, source, grams, method) ───────────────────
+def _name_key(names):
+    """Vectorized url_index.normalize_name"""
+    return (names.astype(str).str.lower()
+            .str.replace(r"[^\w\s+]", " ", regex=True)
+            .str.split().str.join(" "))
+
+def by_stage(results):
+    """Attribute the pipeline's rows to the stage that found them"""
+    stage = results["stage"].copy()
+    pipeline = stage == "pipeline"
+    methods = results["method"].fillna("").astype(str)
+    for prefix, source in PIPELINE_METHODS.items():
+        stage[pipeline & methods.str.startswith(prefix)] = source
+    return results.assign(stage=stage)
+
+def stage_results(results):
+    """Found weights committed by the scraper stages, the pipeline or the work queue, converted to grams"""
+    results = by_stage(results)
+    found = results[pd.to_numeric(results["weight"], errors="coerce").fillna(0) > 0]
+    factor = found["unit"].fillna("g").str.lower().map(UNIT_ALIASES).map(UNIT_GRAMS).fillna(1.0)
+    return pd.DataFrame({
+        "row": found["row"].astype("int64"),
+        "source": found["stage"],
+        "grams": found["weight"].astype("float64") * factor,
+        "method": found["method"].fillna(""),
+    })
+
+def dataset_results(df):
+    """Weights the input dataset already holds from extraction or the knowledge base (not variant copies)"""
+    methods = df["Detection Method"].astype(str)
+    own = (df["Weight"] > 0) & ~methods.str.endswith(" (variant)")
+    frames = []
+    for source, prefix in DATASET_SOURCES.items():
+        rows = df[own & methods.str.startswith(prefix)]
+        frames.append(pd.DataFrame({"row": rows.index.astype("int64"), "source": source,
+                                    "grams": rows["Weight"].to_numpy(), "method": methods[rows.index].to_numpy()}))
+    return pd.concat(frames, ignore_index=True)
+
+def manual_results(df, path):
+    """Hand-entered weights (Product Name, Weight in grams) matched to rows by normalized name"""
+    manual = pd.read_excel(path)
+    manual = manual[pd.to_numeric(manual["Weight"], errors="coerce").fillna(0) > 0]
+    manual = pd.DataFrame({"key": _name_key(manual["Product Name"]), "grams": manual["Weight"].astype("float64")})
+    rows = pd.DataFrame({"row": df.index.astype("int64"), "key": _name_key(df["Product Name"]).to_numpy()})
+    matched = rows.merge(manual.drop_duplicates("key", keep="last"), on="key")
+    return pd.DataFrame({"row": matched["row"], "source": "manual", "grams": matched["grams"], "method": "manual"})
+
+# ── 2. Reconciliation ──────────────────────────────────────────────────────────
+def _text(array):
+    return pc.cast(array, pa.string())
+
+def _strings(array, index):
+    return array.to_pandas(types_mapper={pa.string(): pd.StringDtype()}.get).set_axis(index)
+
+def reconcile(long, precedence=PRECEDENCE, tolerance=TOLERANCE):
+    """
+    One answer per row from the long table: the first source in
+    `precedence` that has a weight. Also returns every source's weight as
+    text and a conflict note where the sources disagree by more than
+    `tolerance`. Columnar throughout, so cost grows with sources, not rows.
+    """
+    present = set(long["source"].unique())
+    order = [source for source in precedence if source in present]
+    long = long[long["source"].isin(order)].drop_duplicates(["row", "source"], keep="last")
+    if long.empty:
+        return pd.DataFrame(columns=["Weight", "Detection Method", "Source", "Weight Sources", "Weight Conflict"])
+    grams = long.pivot(index="row", columns="source", values="grams").reindex(columns=order)
+    methods = long.pivot(index="row", columns="source", values="method").reindex(columns=order)
+
+    values = grams.to_numpy()
+    has = ~np.isnan(values)
+    first = has.argmax(axis=1)
+    pick = np.arange(len(values))
+    low, high = np.nanmin(values, axis=1), np.nanmax(values, axis=1)
+    spread = high / low - 1
+    conflict = spread > tolerance
+
+    # Text columns are built with Arrow kernels: a Python string per row would dominate the run
+    labels = pa.array(order)
+    parts = [pc.binary_join_element_wise(f"{source}=", _text(pc.round(pa.array(grams[source].to_numpy(),
+                                                                           from_pandas=True), 1)), " g", "")
+             for source in order]
+    sources = pc.binary_join_element_wise(*parts, "; ", null_handling="skip")
+    note = pc.binary_join_element_wise(
+        pc.take(labels, np.nanargmax(values, axis=1)), " vs ", pc.take(labels, np.nanargmin(values, axis=1)),
+        ": +", _text(pa.array(np.round(spread * 100).astype("int64"))), "%", "")
+
+    return pd.DataFrame({
+        "Weight": values[pick, first],
+        "Detection Method": methods.to_numpy()[pick, first],
+        "Source": _strings(pc.take(labels, first), grams.index),
+        "Weight Sources": _strings(sources, grams.index),
+        "Weight Conflict": _strings(pc.if_else(conflict, note, ""), grams.index),
+    }, index=grams.index)
+
+def merge(df, merged, unit_col="WeightUnit"):
+    """Write the reconciled answers into df and refill variants from them"""
+    df = df.copy()
+    # Variant copies are redone from the reconciled representatives; any not refilled lose their label
+    copies = df["Detection Method"].astype(str).str.endswith(" (variant)")
+    df.loc[copies, "Weight"] = 0
+    df.loc[copies, "Detection Method"] = ""
+    if "Variant Of" in df.columns:
+        df.loc[copies, "Variant Of"] = ""
+    rows = merged.index.intersection(df.index)
+    df.loc[rows, "Weight"] = merged.loc[rows, "Weight"]
+    df.loc[rows, "Detection Method"] = merged.loc[rows, "Detection Method"]
+    if unit_col in df.columns:
+        df.loc[rows, unit_col] = "g"
+    for col in ("Weight Sources", "Weight Conflict"):
+        df[col] = ""
+        df.loc[rows, col] = merged.loc[rows, col]
+    fan_out(df, families(df), unit_col=unit_col if unit_col in df.columns else None)
+    return df
+
+# ── 3. Entry point ─────────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Merge every source's weights into one sheet")
+    parser.add_argument("--input", default="product_details",
+                        help="dataset whose rows are reconciled (row ids shared by all stages)")
+    parser.add_argument("--output", default="reconciled.xlsx")
+    parser.add_argument("--precedence", default=",".join(PRECEDENCE),
+                        help="comma-separated sources, most trusted first; unlisted sources are ignored")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="flag rows whose sources differ by more than this fraction")
+    parser.add_argument("--manual", default=None, help="workbook of hand-entered weights in grams")
+    args = parser.parse_args()
+    precedence = [s for s in args.precedence.split(",") if s]
+
+    with metrics.phase("load", "reconcile"):
+        df = read_dataset(args.input)
+        if "Detection Method" not in df.columns:
+            df["Detection Method"] = ""
+        # Scraper scripts and the pipeline (ResultStore), sharded workers (work_queue)
+        frames = [stage_results(read_results(precedence + ["pipeline"])),
+                  stage_results(read_queue_results(precedence)),
+                  dataset_results(df)]
+        if args.manual:
+            frames.append(manual_results(df, args.manual))
+        long = pd.concat(frames, ignore_index=True)
+
+    with metrics.phase("reconcile", "reconcile"):
+        merged = reconcile(long, precedence, args.tolerance)
+        df = merge(df, merged)
+
+    conflicts = df[df["Weight Conflict"] != ""]
+    metrics.count("conflict", "reconcile", len(conflicts))
+    for source, n in merged["Source"].value_counts().items():
+        logging.info(f" {source:<12} {n} rows")
+    logging.info(f" {len(merged)} rows reconciled, {len(conflicts)} with sources more than "
+                 f"{args.tolerance:.0%} apart")
+
+    # Disputed weights aren't reused until someone resolves them
+    weight_kb.learn(df[df["Weight Conflict"] == ""], "reconciled")
+    write_dataset(df, "reconciled")
+    export_excel(df, args.output)
+    if len(conflicts):
+        export_excel(conflicts, "weight_conflicts.xlsx")
+        logging.info(" Conflicts saved as 'weight_conflicts.xlsx'")
+    metrics.report("reconcile")
+    logging.info(f" Done! Saved as '{args.output}'.")
+
+if __name__ == "__main__":
+    main()
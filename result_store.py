@@ -0,0 +1,98 @@
+import os
+import time
+import sqlite3
+import threading
+import argparse
+
+import pandas as pd
+
+RESULTS_PATH = os.environ.get("SCRAPER_RESULTS_PATH", "results.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    stage       TEXT NOT NULL,
+    row         INTEGER NOT NULL,
+    product     TEXT NOT NULL,
+    weight      REAL,
+    unit        TEXT,
+    method      TEXT,
+    source      TEXT,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (stage, row)
+);
+"""
+
+def resume_args(description):
+    """Command-line flags shared by every scraper script"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--resume", action="store_true",
+                        help="skip rows already finished by an earlier, interrupted run")
+    return parser
+
+def read_results(stages=None, path=RESULTS_PATH):
+    """Committed rows of every stage (or just `stages`) as one DataFrame, without touching the store"""
+    columns = ["stage", "row", "product", "weight", "unit", "method", "source"]
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns)
+    query = f"SELECT {', '.join(columns)} FROM results"
+    if stages:
+        query += f" WHERE stage IN ({','.join('?' * len(stages))})"
+    with sqlite3.connect(path) as db:
+        return pd.read_sql_query(query, db, params=list(stages or []))
+
+class ResultStore:
+    """
+    Durable per-row results for one scraper stage. Every finished row is
+    committed as soon as it is known, so a crash loses at most the row in
+    flight; --resume runs skip the rows recorded here.
+    """
+
+    def __init__(self, stage, path=RESULTS_PATH, resume=False):
+        self.stage = stage
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        if not resume:
+            self._db.execute("DELETE FROM results WHERE stage = ?", (stage,))
+
+    def record(self, row, product, weight=None, unit=None, method=None, source=None):
+        """Commit one finished row; weight=None means searched but not found"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.stage, int(row), str(product), weight, unit, method, source, time.time())
+            )
+
+    def done(self):
+        """{row: product} for every row already finished in this stage"""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT row, product FROM results WHERE stage = ?", (self.stage,)
+            ).fetchall())
+
+    def pending(self, df, name_col="Product Name"):
+        """Rows of df not finished yet (a row counts as done only if its product still matches)"""
+        done = self.done()
+        keep = [done.get(idx) != str(name) for idx, name in df[name_col].items()]
+        return df[keep]
+
+    def apply(self, df, unit_col=None):
+        """Write every found weight of this stage back into df"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT row, weight, unit, method FROM results WHERE stage = ? AND weight IS NOT NULL",
+                (self.stage,)
+            ).fetchall()
+        for row, weight, unit, method in rows:
+            if row not in df.index:
+                continue
+            df.at[row, "Weight"] = weight
+            df.at[row, "Detection Method"] = method
+            if unit_col:
+                df.at[row, unit_col] = unit
+        return df
+
+    def close(self):
+        self._db.close()
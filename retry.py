@@ -0,0 +1,216 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import defaultdict, deque
+
+import aiohttp
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from metrics import metrics
+from page_cache import CacheMiss
+from rate_limit import scheduler
+from waits import domain_of
+
+TRANSIENT = "transient"     # worth another try after a pause
+BLOCKED = "blocked"         # the site is pushing back: back off and trip the breaker
+NOT_FOUND = "not-found"     # retrying won't change the answer
+FATAL = "fatal"             # a bug or an unforeseen failure: raised at once
+
+# Network and browser failures that another attempt can get past. Selenium's
+# timeouts and stale elements are WebDriverExceptions; dropped connections
+# and socket timeouts are OSErrors.
+TRANSIENT_ERRORS = (WebDriverException, aiohttp.ClientError, asyncio.TimeoutError, OSError)
+
+class Blocked(Exception):
+    """A site answered with a bot wall, 403 or 429 instead of the page"""
+
+class Cancelled(Exception):
+    """A hedged lookup lost the race; raised by check_cancelled() in the scraper thread"""
+
+def check_cancelled(cancelled):
+    """Stop a threaded lookup once its flag (a threading.Event, or None) is set"""
+    if cancelled is not None and cancelled.is_set():
+        raise Cancelled()
+
+def classify(error):
+    if isinstance(error, Blocked):
+        return BLOCKED
+    if isinstance(error, (CacheMiss, NoSuchElementException, Cancelled)):
+        return NOT_FOUND
+    # Timeouts, stale elements, crashed drivers and network errors are retried
+    # a few times, then raised instead of recorded as a miss
+    if isinstance(error, TRANSIENT_ERRORS):
+        return TRANSIENT
+    return FATAL
+
+# ── 1. Backoff ─────────────────────────────────────────────────────────────────
+class Backoff:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base × factor^(attempt-1)))"""
+
+    def __init__(self, base=2.0, factor=2.0, cap=120.0):
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.cap, self.base * self.factor ** (attempt - 1)))
+
+# ── 2. Circuit breaker ─────────────────────────────────────────────────────────
+class CircuitBreaker:
+    """
+    Per-domain breaker over the shared scheduler. `threshold` blocked
+    failures within `window` seconds open it: the domain is paused for
+    `cooldown` seconds, doubling (up to `max_cooldown`) each time it
+    re-opens. After the pause the scheduler lets one request probe the site
+    (half-open) and holds the rest: a success closes the breaker, another
+    block re-opens it at once, and any other failure admits the next probe.
+    """
+
+    def __init__(self, threshold=3, window=60.0, cooldown=60.0, max_cooldown=900.0):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._failures = defaultdict(deque)
+        self._open_until = {}
+        self._next_cooldown = defaultdict(lambda: cooldown)
+
+    def _trip(self, domain, now):
+        pause = self._next_cooldown[domain]
+        self._open_until[domain] = now + pause
+        self._next_cooldown[domain] = min(self.max_cooldown, pause * 2)
+        self._failures[domain].clear()
+        scheduler.pause(domain, pause, probe=True)
+        metrics.count("circuit-open", domain)
+        logging.warning(f"Circuit open for {domain}: pausing {pause:.0f}s")
+
+    def record(self, domain, kind):
+        if not domain:
+            return
+        now = time.monotonic()
+        with self._lock:
+            opened = self._open_until.get(domain)
+            if kind != BLOCKED:
+                if opened is not None and now >= opened:
+                    # The probe neither passed nor was blocked: let another one try
+                    scheduler.settle(domain, closed=False)
+                return
+            if opened is not None and now >= opened:
+                # Half-open probe was blocked too
+                self._trip(domain, now)
+                return
+            failures = self._failures[domain]
+            failures.append(now)
+            while failures and failures[0] < now - self.window:
+                failures.popleft()
+            if len(failures) >= self.threshold and opened is None:
+                self._trip(domain, now)
+
+    def success(self, domain):
+        with self._lock:
+            opened = self._open_until.get(domain)
+            if opened is not None and time.monotonic() < opened:
+                return
+            if opened is not None:
+                logging.info(f"Circuit closed for {domain}")
+                scheduler.settle(domain, closed=True)
+            self._open_until.pop(domain, None)
+            self._failures[domain].clear()
+            self._next_cooldown[domain] = self.cooldown
+
+    def remaining(self, domain):
+        """Seconds until the domain may be probed again (0 when closed)"""
+        with self._lock:
+            opened = self._open_until.get(domain)
+        return max(0.0, opened - time.monotonic()) if opened else 0.0
+
+# ── 3. Policy ──────────────────────────────────────────────────────────────────
+class RetryPolicy:
+    """
+    Decides what happens after a failure: transient and blocked failures
+    are tried again after a jittered backoff (blocked ones at least until
+    the domain's breaker lets requests through), not-found ones are final,
+    and anything else (KeyError, TypeError, ...) is re-raised at once.
+    """
+
+    def __init__(self, max_attempts=4, backoff=None, breaker=None):
+        self.max_attempts = max_attempts
+        self.backoff = backoff or Backoff()
+        self.breaker = breaker or CircuitBreaker()
+
+    @staticmethod
+    def _domain(target):
+        target = target() if callable(target) else target
+        if not target:
+            return None
+        return domain_of(target) if "/" in target else target
+
+    def failure(self, target, error):
+        """Record a failure for a URL/domain; returns its kind"""
+        kind = classify(error)
+        domain = self._domain(target)
+        self.breaker.record(domain, kind)
+        metrics.count(f"failure-{kind}", domain)
+        return kind
+
+    def success(self, target):
+        self.breaker.success(self._domain(target))
+
+    def next_delay(self, kind, attempt, target=None):
+        """Seconds to wait before attempt + 1, or None to give up"""
+        if kind in (NOT_FOUND, FATAL) or attempt >= self.max_attempts:
+            return None
+        delay = self.backoff.delay(attempt)
+        if kind == BLOCKED:
+            delay = max(delay, self.breaker.remaining(self._domain(target)))
+        metrics.count("retry", self._domain(target))
+        return delay
+
+    async def run(self, attempt_fn, target):
+        """
+        Await attempt_fn() until it succeeds or the failure is final; the
+        last error is re-raised. `target` is a URL/domain or a callable
+        returning the one in use when the failure happened.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = await attempt_fn()
+            except Exception as e:
+                kind = self.failure(target, e)
+                delay = self.next_delay(kind, attempt, target)
+                if delay is None:
+                    raise
+                logging.info(f"     {kind} failure ({e!r:.80}); retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                self.success(target)
+                return result
+
+    def call(self, fn, target, cancelled=None):
+        """
+        Blocking flavour of run() for thread-based scrapers. Setting
+        `cancelled` (a threading.Event) cuts a backoff short; fn() is
+        expected to check it and raise Cancelled.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = fn()
+            except Exception as e:
+                kind = self.failure(target, e)
+                delay = self.next_delay(kind, attempt, target)
+                if delay is None:
+                    raise
+                logging.info(f"     {kind} failure ({e!r:.80}); retry {attempt + 1} in {delay:.1f}s")
+                if cancelled is not None:
+                    cancelled.wait(delay)
+                else:
+                    time.sleep(delay)
+            else:
+                self.success(target)
+                return result
+
+# Shared by every scraper in the process
+retry_policy = RetryPolicy()
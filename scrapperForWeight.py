@@ -1,105 +1,186 @@
 import os
-import time
-import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
-import re
+
+from browser_profile import chrome_factory
+from driver_pool import DriverPool
+from metrics import metrics
+from page_cache import PageCache, CacheMiss
+from page_extract import mi_spec_texts, mi_spec_texts_live
+from rate_limit import scheduler
+from result_store import ResultStore, resume_args
+from retry import retry_policy, check_cancelled
+from sites import site_url
+from stage_data import read_dataset, write_dataset
+from url_index import url_index
+from variants import families, representatives, fan_out
+from waits import waiter
+from weight_kb import weight_kb
+from weight_units import parse_weight
 
 # Set up ChromeDriver path
 os.environ['PATH'] += r";C:\SeleniumDrivers\chromedriver-win64\chromedriver-win64"
-#chrome_options.add_argument("--headless")
 
-# Load Excel and prepare DataFrame
-df = pd.read_excel("final_weight_ddg_amazon.xlsx")
-df = df.fillna('')
-df['Weight'] = pd.to_numeric(df['Weight'], errors='coerce').fillna(0)
-filtered_df = df[df['Weight'] == 0].copy()
+# Headless, eager loads and no images/fonts/trackers unless SCRAPER_BROWSER_PROFILE says otherwise
+chrome_options = webdriver.ChromeOptions()
 
-# Launch browser
-driver = webdriver.Chrome()
-wait = WebDriverWait(driver, 10)
+# Fetched pages are reused across runs; see page_cache.py for TTL/offline settings
+cache = PageCache()
 
-# Loop through each product with missing weight
-for index, row in filtered_df.iterrows():
-    product_name = row['Product Name']
-    print(f"\n🔍 Searching for: {product_name}")
+# One warm browser, health-checked and recycled every 50 products
+pool = DriverPool(chrome_factory("mi.com", chrome_options), size=1, max_pages=50, timeout=10, name="mi-specs")
 
-    try:
-        # Always go to Xiaomi homepage fresh for each search
-        driver.get("https://www.mi.com/global/")
-        wait.until(EC.presence_of_element_located((By.ID, 'mi-base-search')))
-        time.sleep(1)
+def load_specs_page(session, product_name):
+    """Search mi.com for the product and return its Specs tab page source"""
+    driver = session.driver
 
-        # Handle popup shortcut if exists
+    # Always go to Xiaomi homepage fresh for each search
+    with metrics.phase("navigation", "mi.com"):
+        driver.get(site_url("https://www.mi.com/global/"))
+
+    # Handle popup shortcut if exists (skipped once the session knows it's absent)
+    shortcut_item = waiter.optional(session, "mi-popup",
+                                    EC.element_to_be_clickable((By.CLASS_NAME, "shortcut__item--wrapper")))
+    if shortcut_item:
         try:
-            shortcut_item = WebDriverWait(driver, 3).until(
-                EC.element_to_be_clickable((By.CLASS_NAME, "shortcut__item--wrapper"))
-            )
             shortcut_item.click()
         except:
             pass
 
-        # Search for the product
-        search_box = wait.until(EC.element_to_be_clickable((By.ID, 'mi-base-search')))
-        search_box.clear()
-        search_box.send_keys(product_name)
-        search_box.send_keys(Keys.ENTER)
-
-        time.sleep(3)
-
-        # Click first result
-        first_item = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, ".product-result-item")))
-        first_item.click()
-
-        # Go to Specs tab
-        specs_link = wait.until(EC.element_to_be_clickable((By.ID, "nav-specs")))
-        specs_link.click()
-
-        time.sleep(3)
-
-        # Look for weight-related spans
-        weight_elements = driver.find_elements(By.CSS_SELECTOR, "span.xm-text, span.xm-text.f-light")
-        found = False
-
-        for el in weight_elements:
-            text = el.text.strip().lower()
-            if any(keyword in text for keyword in ['weight', 'net weight','weight:','g approx','Product net weight']) or re.search(r'\b\d+(\.\d+)?\s*(g|kg)\b', text, re.IGNORECASE):
-                print(f" Found potential weight text: {text}")
-
-                if 'kg' in text:
-                    try:
-                        kg_val = float(''.join(c if c.isdigit() or c == '.' else '' for c in text))
-                        weight_val = int(kg_val * 1000)
-                        df.loc[index, 'Weight'] = weight_val
-                        df.loc[index, 'Detection Method'] = 'scraper'
-                        print(f" Parsed weight: {weight_val}g (from kg)")
-                        found = True
-                        break
-                    except:
-                        continue
-                elif 'g' in text:
-                    try:
-                        g_val = int(''.join(filter(str.isdigit, text)))
-                        df.loc[index, 'Weight'] = g_val
-                        df.loc[index, 'Detection Method'] = 'scraper'
-                        print(f" Parsed weight: {g_val}g")
-                        found = True
-                        break
-                    except:
-                        continue
-
-        if not found:
-            print(" Weight not found or format unrecognized.")
-
-    except Exception as e:
-        print(f" Failed for '{product_name}': {e}")
-        continue
-
-# Save the updated file
-df.to_excel("final.xlsx", index=False)
-print("\n✅ Done! Updated Excel saved as 'product_detailsS_updated.xlsx'.")
-# Close the browser
-driver.quit()  
\ No newline at end of file
+    # Search for the product
+    search_box = waiter.until(driver, EC.element_to_be_clickable((By.ID, 'mi-base-search')), "mi.com")
+    search_box.clear()
+    search_box.send_keys(product_name)
+    search_box.send_keys(Keys.ENTER)
+
+    # Click first result once the results render
+    first_item = waiter.until(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, ".product-result-item")), "mi.com")
+    first_item.click()
+
+    # Go to Specs tab
+    specs_link = waiter.until(driver, EC.element_to_be_clickable((By.ID, "nav-specs")), "mi.com")
+    specs_link.click()
+
+    # Spec rows render after the tab switch (some products have none)
+    waiter.until(driver, EC.presence_of_element_located((By.CSS_SELECTOR, "span.xm-text")), "mi.com", required=False)
+    return driver.page_source
+
+def find_spec_weight(page_source):
+    """First weight among the spec spans, as (grams:int, unit) or (None, None)"""
+    for text in mi_spec_texts(page_source):
+        text = text.strip().lower()
+        m = parse_weight(text)
+        if m:
+            print(f" Found potential weight text: {text}")
+            return int(m.grams), m.unit
+    return None, None
+
+# Seconds a guessed Specs URL gets to show spec rows before search takes over
+PROBE_TIMEOUT = 2
+
+def is_missing_page(driver):
+    """mi.com's 404 page, or a redirect away from the Specs path"""
+    head = driver.execute_script(
+        "return document.title + ' ' + (document.body ? document.body.innerText.slice(0, 200) : '')")
+    head = (head or "").lower()
+    return "404" in head or "not found" in head or "/specs" not in driver.current_url
+
+def load_known_specs(session, product_name, model=None):
+    """
+    Open the Specs page straight from the URL index or the mi.com product
+    path pattern, skipping search and clicks. Returns page source or None.
+    """
+    driver = session.driver
+    for url in url_index.candidates("mi-specs", product_name, model):
+        with metrics.phase("navigation", "mi.com"):
+            driver.get(url)
+        # A wrong guess must not cost the full adaptive timeout before search starts
+        if is_missing_page(driver):
+            continue
+        waiter.until(driver, EC.presence_of_element_located((By.CSS_SELECTOR, "span.xm-text")),
+                     "mi.com", timeout=PROBE_TIMEOUT, required=False)
+        # One in-page script instead of pulling and parsing the whole page per candidate
+        if mi_spec_texts_live(driver):
+            print(f" Direct specs URL: {url}")
+            metrics.count("direct-url", "mi-specs")
+            url_index.put("mi-specs", url, product_name, model)
+            return driver.page_source
+    return None
+
+def lookup_specs(product_name, model=None, cancelled=None):
+    """
+    One product through the Specs tab (cached page if seen before): (grams,
+    unit) or (None, None). Raises Cancelled once `cancelled` is set, before
+    taking a browser and again after waiting for one.
+    """
+    def load():
+        check_cancelled(cancelled)
+        with pool.session() as session, scheduler.slot("mi.com"):
+            check_cancelled(cancelled)
+            page_source = load_known_specs(session, product_name, model)
+            if page_source is None:
+                with metrics.phase("search", "mi.com"):
+                    page_source = load_specs_page(session, product_name)
+                url_index.put("mi-specs", session.driver.current_url, product_name, model)
+            metrics.count("page", "browser")
+            return page_source
+
+    page_source = cache.fetch("mi-specs", product_name, load)
+    with metrics.phase("extraction", "mi-specs"):
+        return find_spec_weight(page_source)
+
+def main():
+    args = resume_args("Fill missing weights from mi.com Specs tabs").parse_args()
+    store = ResultStore("mi-specs", resume=args.resume)
+
+    # Load the typed dataset (minus rows finished by an earlier run)
+    df = read_dataset("final_weight_ddg_amazon")
+    # Products resolved by earlier runs are filled from the knowledge base, not scraped
+    known = weight_kb.fill(df)
+    # Colour/storage/region variants share a weight: scrape one row per family
+    family = families(df)
+    filled = fan_out(df, family)
+    filtered_df = representatives(store.pending(df[df['Weight'] == 0].copy()), family)
+    print(f" {known} rows known from earlier runs, {filled} filled from variants; {len(filtered_df)} family representatives to search")
+
+    # Loop through each product with missing weight
+    try:
+        for index, row in filtered_df.iterrows():
+            product_name = row['Product Name']
+            print(f"\n🔍 Searching for: {product_name}")
+
+            try:
+                # Look for weight-related spans; commit right away so an interrupted run can --resume
+                # Timeouts and stale pages are retried with backoff; CacheMiss is final
+                weight_val, unit = retry_policy.call(
+                    lambda: lookup_specs(product_name, row.get('Model Number')), "mi.com")
+                metrics.outcome("mi-specs", weight_val is not None, 'scraper', product_name)
+                if weight_val is not None:
+                    store.record(index, product_name, weight_val, 'g', 'scraper', 'mi.com/specs')
+                    print(f" Parsed weight: {weight_val}g (from {unit})")
+                else:
+                    store.record(index, product_name, source='mi.com/specs')
+                    print(" Weight not found or format unrecognized.")
+
+            except CacheMiss:
+                print(f" Not cached, skipped in cache-only mode: '{product_name}'")
+                continue
+            except Exception as e:
+                print(f" Failed for '{product_name}': {e}")
+                continue
+    finally:
+        # Close the browser
+        pool.close()
+
+    # Save the updated file, including rows committed by earlier runs
+    store.apply(df)
+    fan_out(df, family)
+    weight_kb.learn(df, "final")
+    path = write_dataset(df, "final")
+    metrics.report("mi-specs", out=print)
+    print(f"\n✅ Done! Updated dataset saved as '{path}'.")
+
+if __name__ == "__main__":
+    main()
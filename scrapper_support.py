@@ -1,15 +1,27 @@
 import os
 import time
-import re
-import pandas as pd
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from browser_profile import chrome_factory
+from driver_pool import DriverPool
+from metrics import metrics
+from page_cache import PageCache
+from page_extract import mi_support_preview, body_text
+from rate_limit import scheduler
+from result_store import ResultStore, resume_args
+from retry import retry_policy, check_cancelled, Cancelled
+from sites import site_url
+from stage_data import read_dataset, write_dataset, export_excel
+from url_index import url_index
+from variants import families, representatives, fan_out
+from waits import waiter
+from weight_kb import weight_kb
+from weight_units import parse_weight
 
 # ── 1. Chrome Driver Setup ──────────────────────────────────────────────────────
 chrome_options = Options()
@@ -17,150 +29,225 @@ chrome_options.add_argument('--disable-blink-features=AutomationControlled')
 chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
 chrome_options.add_experimental_option('useAutomationExtension', False)
 chrome_options.add_argument('--start-maximized')
+# Headless, eager loads and no images/fonts/trackers unless SCRAPER_BROWSER_PROFILE says otherwise
 os.environ['PATH'] += r";C:\SeleniumDrivers\chromedriver-win64\chromedriver-win64"
 
-# ── 2. Load & Prepare DataFrame ────────────────────────────────────────────────
-df = pd.read_excel("final.xlsx").fillna('')
-df['Weight'] = pd.to_numeric(df['Weight'], errors='coerce').fillna(0)
-if 'Detection Method' not in df.columns:
-    df['Detection Method'] = ''
-if 'WeightUnit' not in df.columns:
-    df['WeightUnit'] = ''
-
-# We'll only scrape those with no recorded weight yet
-to_scrape = df[df['Weight'] == 0].copy()
-
-# ── 3. Precompile Regex ────────────────────────────────────────────────────────
-weight_regex = re.compile(
-    r'(\b\d+(?:\.\d+)?\s*(?:kg|kilograms|g|grams)\b)', 
-    re.IGNORECASE
-)
-
-# ── 4. Helper: Parse weight text into (value, unit) ────────────────────────────
-def parse_weight_text(text):
-    txt = text.lower()
-    unit = None
-    if 'kg' in txt:
-        unit = 'kg'
-    elif 'g' in txt:
-        unit = 'g'
-    else:
-        return None, None
-
-    num_match = re.search(r'[\d.]+', txt)
-    if not num_match:
-        return None, None
+MI_HOME = site_url("https://www.mi.com/global/")
 
-    try:
-        value = float(num_match.group())
-    except ValueError:
-        return None, None
-
-    return value, unit
+# Threads only bound browsers; mi.com request pacing comes from rate_limit.scheduler
+MAX_WORKERS = 4
 
-# ── 5. Core Scraping Logic per Product ─────────────────────────────────────────
-def process_row(idx, row):
+def dismiss_popup(session):
+    """Close the shortcut pop-up if it shows up; skipped once it is known to be absent"""
+    popup = waiter.optional(session, "mi-popup",
+                            EC.element_to_be_clickable((By.CLASS_NAME, "shortcut__item--wrapper")))
+    if popup:
+        try:
+            popup.click()
+        except:
+            pass
+
+def warm_mi_home(session):
+    """Open the mi.com homepage once per browser session"""
+    with scheduler.slot("mi.com"):
+        session.driver.get(MI_HOME)
+    waiter.until(session.driver, EC.presence_of_element_located((By.ID, 'mi-base-search')), "mi.com")
+    dismiss_popup(session)
+
+# Warm browsers shared by the worker threads instead of one Chrome per attempt
+pool = DriverPool(chrome_factory("mi.com", chrome_options),
+                  size=MAX_WORKERS, max_pages=50, timeout=15, warmup=warm_mi_home, name="mi-support")
+
+# Fetched pages are reused across runs; see page_cache.py for TTL/offline settings
+cache = PageCache()
+
+# ── 2. Core Scraping Logic per Product ─────────────────────────────────────────
+def preview_weight(html):
+    """WeightMatch from the support search previews, or None"""
+    return parse_weight(mi_support_preview(html).lower())
+
+def page_weight(html):
+    """WeightMatch from a full support article, or None"""
+    return parse_weight(body_text(html).lower())
+
+def process_row(idx, row, cancelled=None):
+    """One product through mi.com support search; a set `cancelled` Event stops it between steps"""
     name = row['Product Name']
     print(f"\n🔍 Searching support for: {name}")
-    for attempt in (1, 2):
-        driver = webdriver.Chrome(options=chrome_options)
-        wait = WebDriverWait(driver, 15)
-        try:
-            driver.get("https://www.mi.com/global/")
-            wait.until(EC.presence_of_element_located((By.ID, 'mi-base-search')))
-            time.sleep(1)
 
-            # Dismiss any pop-up
-            try:
-                popup = WebDriverWait(driver, 3).until(
-                    EC.element_to_be_clickable((By.CLASS_NAME, "shortcut__item--wrapper"))
-                )
-                popup.click()
-            except:
-                pass
-
-            # Perform search
-            search_input = wait.until(EC.element_to_be_clickable((By.ID, 'mi-base-search')))
-            search_input.clear()
-            search_input.send_keys(f"{name} weight")
-            search_input.send_keys(Keys.ENTER)
-            time.sleep(2)
-
-            # Click Support tab
-            support_tab = wait.until(EC.element_to_be_clickable(
-                (By.CSS_SELECTOR, 'li.search-tabs--item[data-tab-type="support"]')
-            ))
-            support_tab.click()
-            time.sleep(2)
-
-            # 1) Preview scrape
-            previews = driver.find_elements(By.CSS_SELECTOR, 'div.support-result-item__left')
-            snippet = " ".join([el.text for el in previews]).lower()
-            m = weight_regex.search(snippet)
+    # 0) Re-extract from cached pages without opening a browser
+    preview_html = cache.get("mi-support", name)
+    if preview_html is not None:
+        metrics.count("page", "cache")
+        m = preview_weight(preview_html)
+        if m:
+            print(f"✅ Found {m.value} {m.unit} in cached preview")
+            return idx, m.value, m.unit, 'support-preview'
+        page_html = cache.get("mi-support-page", name)
+        if page_html is not None:
+            m = page_weight(page_html)
             if m:
-                val, unit = parse_weight_text(m.group(1))
-                if val is not None:
-                    print(f"✅ Found {val} {unit} in preview")
-                    driver.quit()
-                    return idx, val, unit, 'support-preview'
-
-            # 2) Full page scrape (click first result)
-            for _ in range(3):
-                try:
-                    link = wait.until(EC.element_to_be_clickable(
-                        (By.CSS_SELECTOR, 'a.support-result-item__left--link')
-                    ))
-                    link.click()
-                    break
-                except StaleElementReferenceException:
-                    time.sleep(1)
-
-            wait.until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
-            body_text = driver.find_element(By.TAG_NAME, 'body').text.lower()
-            m = weight_regex.search(body_text)
-            if m:
-                val, unit = parse_weight_text(m.group(1))
-                if val is not None:
-                    print(f"✅ Found {val} {unit} in full page")
-                    driver.quit()
-                    return idx, val, unit, 'support-full'
-
-            print("⚠️ No weight found on support pages.")
-            driver.quit()
+                print(f"✅ Found {m.value} {m.unit} in cached full page")
+                return idx, m.value, m.unit, 'support-full'
+            return idx, None, None, 'support-none'
+    if cache.offline:
+        print(f"⏭️ Not cached, skipped in cache-only mode: '{name}'")
+        return idx, None, None, ''
+
+    model = row.get('Model Number')
+    attempt = 0
+    while True:
+        attempt += 1
+        delay = None
+        if cancelled is not None and cancelled.is_set():
             return idx, None, None, ''
-
-        except TimeoutException:
-            print(f"⏳ Timeout on attempt {attempt} for '{name}'")
+        with pool.session() as session, scheduler.slot("mi.com"):
+            driver = session.driver
             try:
-                with open(f"failed_{idx}.html", "w", encoding="utf-8") as f:
-                    f.write(driver.page_source)
-            except:
-                pass
-            driver.quit()
-            time.sleep(2)
-
-        except Exception as e:
-            print(f" Error for '{name}': {e}")
-            driver.quit()
+                # Waiting for a browser and a slot may have outlasted the hedge
+                check_cancelled(cancelled)
+
+                # Support article already resolved on an earlier run: open it directly
+                known_url = url_index.get("mi-support", name, model)
+                if known_url and attempt == 1:
+                    with metrics.phase("navigation", "mi.com"):
+                        driver.get(known_url)
+                        waiter.page_ready(driver, "mi.com")
+                    page_html = driver.page_source
+                    metrics.count("page", "browser")
+                    m = page_weight(page_html)
+                    if m:
+                        cache.put("mi-support-page", name, page_html)
+                        print(f"✅ Found {m.value} {m.unit} on indexed support page")
+                        return idx, m.value, m.unit, 'support-full'
+                    url_index.forget("mi-support", name, model)
+
+                with metrics.phase("search", "mi.com"):
+                    # Warm sessions usually still show the header search box; only reload home if not
+                    if not driver.find_elements(By.ID, 'mi-base-search'):
+                        driver.get(MI_HOME)
+                    dismiss_popup(session)
+
+                    # Perform search
+                    search_input = waiter.until(driver, EC.element_to_be_clickable((By.ID, 'mi-base-search')), "mi.com")
+                    search_input.clear()
+                    search_input.send_keys(f"{name} weight")
+                    search_input.send_keys(Keys.ENTER)
+
+                    # Click Support tab once the result tabs are rendered
+                    support_tab = waiter.until(driver, EC.element_to_be_clickable(
+                        (By.CSS_SELECTOR, 'li.search-tabs--item[data-tab-type="support"]')
+                    ), "mi.com")
+                    support_tab.click()
+
+                    # Support results (absent when there are none, so don't fail on it)
+                    waiter.until(driver, EC.presence_of_element_located(
+                        (By.CSS_SELECTOR, 'div.support-result-item__left')
+                    ), "mi.com", required=False)
+
+                # 1) Preview scrape
+                preview_html = driver.page_source
+                metrics.count("page", "browser")
+                cache.put("mi-support", name, preview_html)
+                m = preview_weight(preview_html)
+                if m:
+                    print(f"✅ Found {m.value} {m.unit} in preview")
+                    return idx, m.value, m.unit, 'support-preview'
+
+                # 2) Full page scrape (click first result)
+                results_url = driver.current_url
+                with metrics.phase("navigation", "mi.com"):
+                    for _ in range(3):
+                        try:
+                            link = waiter.until(driver, EC.element_to_be_clickable(
+                                (By.CSS_SELECTOR, 'a.support-result-item__left--link')
+                            ), "mi.com")
+                            link.click()
+                            break
+                        except StaleElementReferenceException:
+                            continue
+
+                    # Wait for the navigation to the support article, then for it to parse
+                    waiter.until(driver, EC.url_changes(results_url), "mi.com", required=False)
+                    waiter.page_ready(driver, "mi.com")
+                page_html = driver.page_source
+                metrics.count("page", "browser")
+                cache.put("mi-support-page", name, page_html)
+                m = page_weight(page_html)
+                if m:
+                    url_index.put("mi-support", driver.current_url, name, model)
+                    print(f"✅ Found {m.value} {m.unit} in full page")
+                    return idx, m.value, m.unit, 'support-full'
+
+                print("⚠️ No weight found on support pages.")
+                return idx, None, None, 'support-none'
+
+            except Cancelled:
+                return idx, None, None, ''
+
+            except TimeoutException as e:
+                print(f"⏳ Timeout on attempt {attempt} for '{name}'")
+                try:
+                    with open(f"failed_{idx}.html", "w", encoding="utf-8") as f:
+                        f.write(driver.page_source)
+                except:
+                    pass
+                delay = retry_policy.next_delay(retry_policy.failure("mi.com", e), attempt, "mi.com")
+
+            except Exception as e:
+                print(f" Error for '{name}': {e}")
+                delay = retry_policy.next_delay(retry_policy.failure("mi.com", e), attempt, "mi.com")
+
+        # Not-found errors and exhausted retries end here; back off outside
+        # the session so the browser serves other rows in the meantime
+        if delay is None:
             return idx, None, None, ''
+        if cancelled is not None:
+            cancelled.wait(delay)
+        else:
+            time.sleep(delay)
+
+# ── 3. Execute in Parallel, Committing Each Row as It Finishes ────────────────
+def main():
+    args = resume_args("Fill missing weights from mi.com support pages").parse_args()
+    store = ResultStore("mi-support", resume=args.resume)
+
+    df = read_dataset("final")
+    if 'Detection Method' not in df.columns:
+        df['Detection Method'] = ''
+    if 'WeightUnit' not in df.columns:
+        df['WeightUnit'] = ''
+
+    # We'll only scrape those with no recorded weight yet (and not finished by an earlier run)
+    # Colour/storage/region variants share a weight: scrape one row per family
+    # Products resolved by earlier runs are filled from the knowledge base, not scraped
+    known = weight_kb.fill(df, unit_col='WeightUnit')
+    family = families(df)
+    filled = fan_out(df, family, unit_col='WeightUnit')
+    to_scrape = representatives(store.pending(df[df['Weight'] == 0].copy()), family)
+    print(f" {known} rows known from earlier runs, {filled} filled from variants; {len(to_scrape)} family representatives to search")
 
-    # If both attempts fail
-    return idx, None, None, ''
-
-# ── 6. Execute in Parallel & Collect Results ──────────────────────────────────
-results = []
-with ThreadPoolExecutor(max_workers=4) as exe:
-    futures = [exe.submit(process_row, i, r) for i, r in to_scrape.iterrows()]
-    for fut in futures:
-        res = fut.result()
-        if res:
-            results.append(res)
-# ── 7. Write Back to DataFrame & Save ──────────────────────────────────────────
-for idx, val, unit, method in results:
-    if val is not None:
-        df.at[idx, 'Weight'] = val
-        df.at[idx, 'WeightUnit'] = unit
-        df.at[idx, 'Detection Method'] = method
-
-df.to_excel("done.xlsx", index=False)
-print("\n✅ Done. Saved as 'weigh.xlsx'.")
\ No newline at end of file
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as exe:
+            futures = {exe.submit(process_row, i, r): r['Product Name'] for i, r in to_scrape.iterrows()}
+            for fut in as_completed(futures):
+                idx, val, unit, method = fut.result()
+                # Errors leave no method, so the row is retried on --resume
+                if method:
+                    metrics.outcome("mi-support", val is not None, method, futures[fut])
+                    store.record(idx, futures[fut], val, unit, method if val is not None else None, 'mi.com/support')
+    finally:
+        pool.close()
+
+    # ── 4. Write Back to DataFrame & Save ──────────────────────────────────────
+    store.apply(df, unit_col='WeightUnit')
+    fan_out(df, family, unit_col='WeightUnit')
+    weight_kb.learn(df, "done", unit_col='WeightUnit')
+    # Last scraping stage: keep the dataset and hand the workbook over
+    write_dataset(df, "done")
+    export_excel(df, "done.xlsx")
+    metrics.report("mi-support", out=print)
+    print("\n✅ Done. Saved as 'done.xlsx'.")
+
+if __name__ == "__main__":
+    main()
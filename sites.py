@@ -0,0 +1,19 @@
+import os
+from urllib.parse import urlsplit
+
+# Base URL of a stand-in for the real sites (mock_sites.py); empty = the real sites.
+# 'https://www.mi.com/global/' is then fetched as '{SITE_BASE}/www.mi.com/global/'.
+SITE_BASE = os.environ.get("SCRAPER_SITE_BASE", "").rstrip("/")
+
+def site_url(url):
+    """URL to request for a real-site URL (unchanged unless SCRAPER_SITE_BASE is set)"""
+    if not SITE_BASE or not url or url.startswith(SITE_BASE):
+        return url
+    parts = urlsplit(url)
+    return f"{SITE_BASE}/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+
+def real_url(url):
+    """Inverse of site_url(), so per-domain logic still sees 'mi.com', 'amazon.com', ..."""
+    if not SITE_BASE or not url or not url.startswith(SITE_BASE + "/"):
+        return url
+    return "https://" + url[len(SITE_BASE) + 1:]
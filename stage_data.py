@@ -0,0 +1,128 @@
+import os
+import argparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Intermediate datasets live here as Parquet; Excel is only written at the end
+DATA_DIR = os.environ.get("SCRAPER_DATA_DIR", "data")
+
+# Stable schema for every stage. 'Row' is the row id from the first stage, so
+# results stored per row (result_store.py) still line up after filtered reads.
+SCHEMA = pa.schema([
+    ("Row", pa.int64()),
+    ("Product Name", pa.string()),
+    ("Product Name (EN)", pa.string()),
+    ("Model Number", pa.string()),
+    ("Weight", pa.float64()),
+    ("WeightUnit", pa.string()),
+    ("Detection Method", pa.string()),
+    ("Variant Of", pa.string()),
+    ("Weight Sources", pa.string()),
+    ("Weight Conflict", pa.string()),
+])
+TEXT_DEFAULT = ""
+
+def dataset_path(name):
+    return os.path.join(DATA_DIR, f"{name}.parquet")
+
+# ── 1. Types ───────────────────────────────────────────────────────────────────
+def conform(df):
+    """Give df the schema's dtypes: Weight float (0 when missing), text columns str ('' when missing)"""
+    df = df.copy()
+    for field in SCHEMA:
+        if field.name == "Row" or field.name not in df.columns:
+            continue
+        if pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce").fillna(0).astype("float64")
+        else:
+            df[field.name] = df[field.name].fillna(TEXT_DEFAULT).astype(str)
+    # Text columns outside the schema are kept as text; numeric ones keep their type
+    for col in df.columns:
+        if SCHEMA.get_field_index(col) == -1 and pd.api.types.is_string_dtype(df[col].dtype):
+            df[col] = df[col].fillna(TEXT_DEFAULT).astype(str)
+    return df
+
+def _schema_for(df):
+    """SCHEMA fields present in df, in df's column order, plus any extra columns typed from pandas"""
+    extra = [col for col in df.columns if SCHEMA.get_field_index(col) == -1]
+    inferred = pa.Schema.from_pandas(df[extra], preserve_index=False) if extra else pa.schema([])
+    fields = [pa.field("Row", pa.int64())]
+    for col in df.columns:
+        index = SCHEMA.get_field_index(col)
+        fields.append(SCHEMA.field(index) if index != -1 else inferred.field(col))
+    return pa.schema(fields)
+
+# ── 2. Read / write ────────────────────────────────────────────────────────────
+def read_dataset(name, columns=None, filters=None, missing_only=False):
+    """
+    Load a stage's dataset with its row ids as the index. `columns` reads
+    only those columns; `filters` (pyarrow DNF, e.g. [("Weight", "==", 0)])
+    and missing_only=True are pushed down to the Parquet reader. A name or
+    path ending in .xlsx, or a dataset not converted yet, is read from Excel.
+    """
+    if missing_only:
+        filters = (filters or []) + [("Weight", "==", 0)]
+    path = dataset_path(name)
+    if not name.endswith(".xlsx") and os.path.exists(path):
+        wanted = None if columns is None else ["Row"] + [c for c in columns if c != "Row"]
+        table = pq.read_table(path, columns=wanted, filters=filters or None)
+        return table.to_pandas().set_index("Row").rename_axis(None)
+
+    # Legacy workbook: convert once, then apply the same selection in memory
+    xlsx = name if name.endswith(".xlsx") else f"{name}.xlsx"
+    df = conform(pd.read_excel(xlsx))
+    for col, op, value in filters or []:
+        if op != "==":
+            raise ValueError(f"Only '==' filters are supported on Excel input, got {op!r}")
+        df = df[df[col] == value]
+    return df[[c for c in columns if c != "Row"]] if columns is not None else df
+
+def write_dataset(df, name):
+    """Write df (index = row ids) as the stage's Parquet dataset, atomically"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    df = conform(df)
+    table = pa.Table.from_pandas(df.rename_axis("Row").reset_index(), schema=_schema_for(df),
+                                 preserve_index=False)
+    path = dataset_path(name)
+    pq.write_table(table, path + ".tmp", compression="zstd")
+    os.replace(path + ".tmp", path)
+    return path
+
+def export_excel(df, path):
+    """Final step only: hand a finished dataset over as a workbook"""
+    df.to_excel(path, index=False)
+    return path
+
+# ── 3. Command line ────────────────────────────────────────────────────────────
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and export the Parquet datasets in " + DATA_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    show = sub.add_parser("show", help="print rows of a dataset")
+    show.add_argument("name")
+    show.add_argument("--columns", help="comma-separated columns to read")
+    show.add_argument("--missing", action="store_true", help="only rows with Weight == 0")
+
+    export = sub.add_parser("export", help="write a dataset to .xlsx")
+    export.add_argument("name")
+    export.add_argument("output")
+
+    convert = sub.add_parser("import", help="convert a legacy .xlsx into a dataset")
+    convert.add_argument("xlsx")
+    convert.add_argument("name")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        columns = args.columns.split(",") if args.columns else None
+        df = read_dataset(args.name, columns=columns, missing_only=args.missing)
+        print(df.to_string())
+        print(f"\n{len(df)} rows")
+    elif args.command == "export":
+        print(f"✅ Saved {export_excel(read_dataset(args.name), args.output)}")
+    else:
+        print(f"✅ Saved {write_dataset(read_dataset(args.xlsx), args.name)}")
+
+if __name__ == "__main__":
+    main()
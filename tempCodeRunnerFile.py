@@ -1,54 +1,232 @@
 import os
-import re
-import time
+import json
+import asyncio
 import pandas as pd
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, RateLimitError
+
+from metrics import metrics
+from page_cache import PageCache
+from rate_limit import scheduler
+from result_store import ResultStore, resume_args
+from stage_data import read_dataset, write_dataset, export_excel
+from weight_kb import weight_kb
+from weight_units import parse_weight
 
 # Load environment variables from .env
 load_dotenv()
-client = OpenAI()
 
-def get_weight_from_gpt(product_name):
+MODEL = "gpt-3.5-turbo"  # free-tier friendly model
+BATCH_SIZE = 20          # products per chat completion
+CONCURRENCY = 4          # chat completions in flight
+BATCH_ROUNDS = 3         # tries for products a truncated batch reply left out
+
+# Answers never expire: a product's weight doesn't change between runs
+answers = PageCache(path=os.environ.get("LLM_ANSWER_CACHE", "llm_answers.sqlite"), ttl=0)
+
+# Clients are created on first use; OPENAI_BASE_URL / --base-url point them at a local stub
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = OpenAI()
+    return _client
+
+def answer_key(product_name, model_number=""):
+    return f"{product_name}|{str(model_number).strip()}"
+
+def cached_answer(product_name, model_number=""):
+    """(found, grams) from the answer cache; grams is None for a remembered 'unknown'"""
+    text = answers.get("llm", answer_key(product_name, model_number))
+    if text is None:
+        return False, None
+    return True, json.loads(text)
+
+def remember(product_name, model_number, grams):
+    answers.put("llm", answer_key(product_name, model_number), json.dumps(grams))
+
+# ── 1. One product per request ─────────────────────────────────────────────────
+def get_weight_from_gpt(product_name, model_number=""):
+    found, grams = cached_answer(product_name, model_number)
+    if found:
+        return (grams, "API") if grams else (0, "API (Not Found)")
+
     prompt = f"What is the weight of the product '{product_name}' in grams? Just give the number followed by 'g'."
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # free-tier friendly model
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        # Paced by the shared per-domain scheduler instead of a fixed sleep
+        with scheduler.slot("api.openai.com"), metrics.phase("llm-request", "api.openai.com"):
+            response = get_client().chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            )
+        scheduler.feedback("api.openai.com")
         reply = response.choices[0].message.content.strip()
         print(f"GPT response: {reply}")
 
-        match = re.search(r"(\d+\.?\d*)\s*g", reply.lower())
+        match = parse_weight(reply)
+        remember(product_name, model_number, match.grams if match else None)
         if match:
-            return float(match.group(1)), "API"
+            return match.grams, "API"
         else:
             return 0, "API (Not Found)"
+    except RateLimitError as e:
+        scheduler.feedback("api.openai.com", blocked=True)
+        print(f"❌ Rate limited for '{product_name}': {e}")
+        return 0, "API (Error)"
     except Exception as e:
         print(f"❌ Error for '{product_name}': {e}")
         return 0, "API (Error)"
 
+# ── 2. Batched, concurrent requests ────────────────────────────────────────────
+BATCH_PROMPT = (
+    "For each product below, give its weight in grams. Reply with JSON only, "
+    'shaped {"weights": [{"id": "<id>", "grams": <number or null>}]}, one entry per '
+    "product, using null when you don't know.\n\n"
+)
+
+def parse_batch_reply(reply, ids):
+    """
+    Map each requested id the reply answers to grams (None for an explicit or
+    unparseable "don't know"). Ids the reply leaves out, e.g. because it was
+    cut off, are not in the result, so they are never cached as unknown.
+    """
+    text = reply.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    data = json.loads(text)
+    items = data.get("weights", []) if isinstance(data, dict) else data
+    wanted, weights = set(ids), {}
+    for item in items:
+        key = str(item.get("id"))
+        if key not in wanted:
+            continue
+        grams = item.get("grams")
+        if isinstance(grams, str):
+            match = parse_weight(grams)
+            grams = match.grams if match else None
+        weights[key] = float(grams) if isinstance(grams, (int, float)) and grams > 0 else None
+    return weights
+
+async def ask_batch(client, batch, slots):
+    """batch: [(id, product name, model number)] → {id: grams | None}"""
+    listing = json.dumps([{"id": i, "name": name, "model": model} for i, name, model in batch],
+                         ensure_ascii=False)
+    async with slots, scheduler.aslot("api.openai.com"):
+        try:
+            with metrics.phase("llm-request", "api.openai.com"):
+                response = await client.chat.completions.create(
+                    model=MODEL,
+                    messages=[{"role": "user", "content": BATCH_PROMPT + listing}],
+                    response_format={"type": "json_object"},
+                    temperature=0,
+                )
+        except RateLimitError:
+            scheduler.feedback("api.openai.com", blocked=True)
+            metrics.count("rate-limited", "api.openai.com")
+            raise
+    scheduler.feedback("api.openai.com")
+    return parse_batch_reply(response.choices[0].message.content, [i for i, _, _ in batch])
+
+async def lookup_weights(products, on_result, batch_size=BATCH_SIZE, concurrency=CONCURRENCY, base_url=None,
+                         rounds=BATCH_ROUNDS):
+    """
+    products: [(id, product name, model number)]. Cached answers are served
+    first; the rest go out in batches, `concurrency` requests at a time, and
+    products a reply left out are asked again, up to `rounds` times in all.
+    on_result(str(id), grams | None, method) is called as soon as each answer
+    is known; failed batches and products never answered get 'API (Error)'.
+    """
+    misses = []
+    for item_id, name, model in products:
+        found, grams = cached_answer(name, model)
+        if found:
+            metrics.count("cache-hit", "llm")
+            on_result(str(item_id), grams, "API (cached)" if grams else "API (Not Found)")
+        else:
+            misses.append((str(item_id), name, model))
+
+    if not misses:
+        return
+
+    # Only created when something has to be asked, so fully cached runs need no API key
+    client = AsyncOpenAI(base_url=base_url) if base_url else AsyncOpenAI()
+    slots = asyncio.Semaphore(concurrency)
+    by_id = {i: (name, model) for i, name, model in misses}
+
+    async def run(batch):
+        try:
+            return batch, await ask_batch(client, batch, slots), None
+        except Exception as e:
+            return batch, None, e
+
+    pending = misses
+    for _ in range(rounds):
+        if not pending:
+            break
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        unanswered = []
+        for next_done in asyncio.as_completed([run(b) for b in batches]):
+            batch, weights, error = await next_done
+            if error is not None:
+                print(f"❌ Batch of {len(batch)} failed: {error}")
+                for item_id, _, _ in batch:
+                    on_result(item_id, None, "API (Error)")
+                continue
+            for item_id, grams in weights.items():
+                name, model = by_id[item_id]
+                remember(name, model, grams)
+                on_result(item_id, grams, "API" if grams else "API (Not Found)")
+            unanswered += [item for item in batch if item[0] not in weights]
+        if unanswered:
+            metrics.count("partial-reply", "llm", len(unanswered))
+        pending = unanswered
+    # Left uncached, so a later run asks about them again
+    for item_id, _, _ in pending:
+        on_result(item_id, None, "API (Error)")
+    await client.close()
+
 def main():
-    input_file = "product_detailsS_updated.xlsx"
-    output_file = "product_weights_with_api.xlsx"
+    input_name = "product_detailsS_updated"
+    output_name = "product_weights_with_api"
 
-    df = pd.read_excel(input_file)
+    parser = resume_args("Ask the LLM for weights still missing")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint, e.g. a local stub server")
+    args = parser.parse_args()
+    store = ResultStore("llm", resume=args.resume)
 
-    for index, row in df[df['Weight'] == 0].iterrows():
-        product_name = row["Product Name (EN)"]
-        print(f"🔍 Querying: {product_name}")
+    df = read_dataset(input_name)
+    # Products resolved by earlier runs are filled from the knowledge base, not asked about
+    known = weight_kb.fill(df, name_col="Product Name (EN)")
+    todo = store.pending(df[df['Weight'] == 0], "Product Name (EN)")
+    models = todo["Model Number"].fillna("") if "Model Number" in todo.columns else pd.Series("", index=todo.index)
+    products = [(idx, name, str(models[idx]).strip()) for idx, name in todo["Product Name (EN)"].items()]
+    rows = {str(idx): idx for idx in todo.index}
+    print(f"📚 {known} rows known from earlier runs")
+    print(f"🔍 Querying {len(products)} products in batches of {args.batch_size}")
 
-        weight, method = get_weight_from_gpt(product_name)
-        df.loc[index, 'Weight'] = weight
-        df.loc[index, 'Detection Method'] = method
+    def on_result(item_id, grams, method):
+        idx = rows[item_id]
+        name = todo.at[idx, "Product Name (EN)"]
+        metrics.outcome("llm", bool(grams), method, name)
+        df.loc[idx, 'Weight'] = grams or 0
+        df.loc[idx, 'Detection Method'] = method
+        # Commit right away; errors are left out so --resume asks again
+        if method != "API (Error)":
+            store.record(idx, name, grams, "g" if grams else None, method, MODEL)
 
-        time.sleep(1.5)  # avoid hitting rate limits
+    asyncio.run(lookup_weights(products, on_result, args.batch_size, args.concurrency, args.base_url))
 
-    df.to_excel(output_file, index=False)
-    print(f"✅ Done! Updated file saved as '{output_file}'")
+    store.apply(df)
+    write_dataset(df, output_name)
+    export_excel(df, f"{output_name}.xlsx")
+    metrics.report("llm", out=print)
+    print(f"✅ Done! Updated file saved as '{output_name}.xlsx'")
 
 if __name__ == "__main__":
     main()
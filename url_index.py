@@ -0,0 +1,121 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
+from sites import site_url
+
+INDEX_PATH = os.environ.get("SCRAPER_URL_INDEX", "url_index.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    kind       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    url        TEXT NOT NULL,
+    hits       INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+# Model Number values weightFinder writes when the body had none
+NO_MODEL = ("", " ", "غير متوفر", "nan", "none")
+
+# ── 1. Keys ────────────────────────────────────────────────────────────────────
+def normalize_name(name):
+    """'Redmi Note 13 Pro (Global)' → 'redmi note 13 pro global'"""
+    return " ".join(re.sub(r"[^\w\s+]", " ", str(name).lower()).split())
+
+def normalize_model(model):
+    """'M2316 E1' / 'm2316-e1' → 'M2316E1'; None when there is no model number"""
+    text = str(model if model is not None else "").strip()
+    if text.lower() in NO_MODEL:
+        return None
+    return re.sub(r"[\s\-_/]", "", text).upper() or None
+
+def slug(name):
+    """'Redmi Note 13 Pro+ 5G' → 'redmi-note-13-pro-plus-5g' (mi.com product path style)"""
+    text = str(name).lower().replace("+", " plus ")
+    return "-".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+# ── 2. Direct URL patterns (tried when the index has no entry) ─────────────────
+def mi_specs_urls(name):
+    base = slug(name)
+    urls = [site_url(f"https://www.mi.com/global/product/{base}/specs/")]
+    # Connectivity suffixes usually share the family page
+    family = re.sub(r"-(4g|5g|nfc)$", "", base)
+    if family != base:
+        urls.append(site_url(f"https://www.mi.com/global/product/{family}/specs/"))
+    return urls
+
+# Neither Amazon nor mi.com has a model-number product path: model numbers only
+# help through the index keys, and Amazon relies on indexed product pages alone
+PATTERNS = {
+    "mi-specs": lambda name, model: mi_specs_urls(name),
+}
+
+# ── 3. Persistent index ────────────────────────────────────────────────────────
+class UrlIndex:
+    """
+    Resolved product URLs per source ('amazon', 'mi-specs', 'mi-support'),
+    keyed by normalized Model Number and by normalized product name. Lookups
+    try the model number first, so renamed listings of the same model still hit.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    @staticmethod
+    def _keys(name, model=None):
+        keys = []
+        model_key = normalize_model(model)
+        if model_key:
+            keys.append(f"model:{model_key}")
+        if name:
+            keys.append(f"name:{normalize_name(name)}")
+        return keys
+
+    def get(self, kind, name, model=None):
+        with self._lock:
+            for key in self._keys(name, model):
+                row = self._db.execute("SELECT url FROM urls WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+                if row:
+                    self._db.execute("UPDATE urls SET hits = hits + 1 WHERE kind = ? AND key = ?", (kind, key))
+                    return row[0]
+        return None
+
+    def put(self, kind, url, name, model=None):
+        if not url:
+            return
+        now = time.time()
+        with self._lock:
+            for key in self._keys(name, model):
+                self._db.execute(
+                    "INSERT INTO urls(kind, key, url, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(kind, key) DO UPDATE SET url = excluded.url, updated_at = excluded.updated_at",
+                    (kind, key, url, now)
+                )
+
+    def forget(self, kind, name, model=None):
+        """Drop a URL that turned out to be stale"""
+        with self._lock:
+            for key in self._keys(name, model):
+                self._db.execute("DELETE FROM urls WHERE kind = ? AND key = ?", (kind, key))
+
+    def candidates(self, kind, name, model=None):
+        """Indexed URL first, then direct URL patterns; duplicates removed"""
+        urls = []
+        indexed = self.get(kind, name, model)
+        if indexed:
+            urls.append(indexed)
+        pattern = PATTERNS.get(kind)
+        if pattern:
+            urls += [u for u in pattern(name, model) if u not in urls]
+        return urls
+
+# Shared by every scraper in the process
+url_index = UrlIndex()
@@ -0,0 +1,111 @@
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+from url_index import normalize_name, normalize_model
+
+# ── 1. Variant tokens ──────────────────────────────────────────────────────────
+# Words that tell colour, storage/size or market variants of one product apart.
+# Weight doesn't change between them, so they are dropped from the family name.
+COLOURS = {
+    "black", "white", "blue", "green", "red", "pink", "purple", "gold", "silver",
+    "grey", "gray", "graphite", "midnight", "yellow", "orange", "cyan", "mint",
+    "lavender", "violet", "coral", "aurora", "sage", "teal", "navy", "bronze",
+    "champagne",
+    "أسود", "اسود", "أبيض", "ابيض", "أزرق", "ازرق", "أخضر", "اخضر", "أحمر", "احمر",
+    "وردي", "بنفسجي", "ذهبي", "فضي", "رمادي", "أصفر", "اصفر", "برتقالي",
+}
+# Only dropped right before a colour word: 'Ocean Blue', 'Space Grey'
+COLOUR_MODIFIERS = {
+    "ocean", "forest", "sky", "ice", "dark", "light", "deep", "space", "pearl",
+    "glacier", "starry", "arctic", "lake", "misty", "rose", "jade",
+}
+REGIONS = {
+    "global", "international", "version", "eu", "uk", "us", "cn", "china",
+    "india", "indian", "europe", "european", "gcc", "uae", "ksa", "mea",
+    "عالمي", "العالمية", "نسخة", "إصدار",
+}
+SIZES = {"xs", "xl", "xxl", "ram", "rom", "storage"}
+# 8gb, 256 gb, 1tb, 8+256, 8gb+256gb, 12/512
+STORAGE_RE = re.compile(r"\b\d+\s*(?:gb|tb)?\s*[+/]\s*\d+\s*(?:gb|tb)?\b|\b\d+\s*(?:gb|tb)\b")
+# Names weightFinder and blank cells leave behind: not a product, never a family or KB key
+NO_NAME = {"", "unknown", "nan", "none", "n a", "غير متوفر"}
+
+@lru_cache(maxsize=1 << 17)
+def canonical_name(name):
+    """'Redmi Note 13 8GB+256GB Midnight Black (Global)' → 'redmi note 13'; '' for placeholders like 'Unknown'"""
+    text = STORAGE_RE.sub(" ", str(name if name is not None else "").lower())
+    tokens = normalize_name(text).split()
+    kept = [t for t, after in zip(tokens, tokens[1:] + [""])
+            if t not in COLOURS and t not in REGIONS and t not in SIZES
+            and not (t in COLOUR_MODIFIERS and after in COLOURS)]
+    key = " ".join(kept)
+    return "" if key in NO_NAME else key
+
+# ── 2. Families ────────────────────────────────────────────────────────────────
+def families(df, name_col="Product Name", model_col="Model Number"):
+    """
+    Family id per row. Rows are joined when they share a blocking key: the
+    normalized Model Number or the canonical name. Each key is a dict lookup,
+    so grouping stays linear in the catalogue size. Blank and placeholder
+    names give no name key, so such rows only join through a model number.
+    """
+    parent = {}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    models = df[model_col] if model_col in df.columns else pd.Series(None, index=df.index)
+    for idx, name, model in zip(df.index, df[name_col], models):
+        parent[idx] = idx
+        name_key = canonical_name(name)
+        keys = [f"name:{name_key}"] if name_key else []
+        model_key = normalize_model(model)
+        if model_key:
+            keys.append(f"model:{model_key}")
+        for key in keys:
+            if key in owner:
+                parent[find(idx)] = find(owner[key])
+            else:
+                owner[key] = idx
+
+    return pd.Series([find(idx) for idx in df.index], index=df.index, name="Family")
+
+def representatives(df, family):
+    """One row of df per family (the first one in file order); only these get scraped"""
+    first = family[df.index].drop_duplicates().index
+    return df[df.index.isin(first)]
+
+# ── 3. Fan-out ─────────────────────────────────────────────────────────────────
+def fan_out(df, family, unit_col=None, name_col="Product Name"):
+    """
+    Copy each family's known weight to its members still at 0. Copied rows
+    get ' (variant)' appended to Detection Method and the source row's name
+    in 'Variant Of'. Returns how many rows were filled.
+    """
+    weights = pd.to_numeric(df["Weight"], errors="coerce").fillna(0)
+    known = weights[weights > 0]
+    source = known.groupby(family[known.index]).head(1)
+    source_of = pd.Series(source.index, index=family[source.index].values)
+
+    missing = weights.index[weights == 0]
+    donors = family[missing].map(source_of).dropna().astype(df.index.dtype)
+    if donors.empty:
+        return 0
+
+    if "Variant Of" not in df.columns:
+        df["Variant Of"] = ""
+    if "Detection Method" not in df.columns:
+        df["Detection Method"] = ""
+    rows, sources = donors.index, donors.to_numpy()
+    df.loc[rows, "Weight"] = df.loc[sources, "Weight"].to_numpy()
+    df.loc[rows, "Detection Method"] = (df.loc[sources, "Detection Method"].astype(str) + " (variant)").to_numpy()
+    df.loc[rows, "Variant Of"] = df.loc[sources, name_col].to_numpy()
+    if unit_col:
+        df.loc[rows, unit_col] = df.loc[sources, unit_col].to_numpy()
+    return len(donors)
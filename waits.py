@@ -0,0 +1,105 @@
+import time
+import threading
+from collections import defaultdict, deque
+from urllib.parse import urlparse
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+from metrics import metrics
+from sites import real_url
+
+def domain_of(url):
+    """'https://www.mi.com/global/' → 'mi.com' (also for the same page on the mock sites)"""
+    host = urlparse(real_url(url) or "").netloc.lower().split(":")[0]
+    return host[4:] if host.startswith("www.") else host
+
+class AdaptiveWaiter:
+    """
+    Condition-driven waits instead of fixed sleeps.
+
+    Every successful wait records how long the condition took per domain;
+    once a domain has `min_samples` observations its timeout becomes
+    `factor` × the `quantile` latency, clamped to [floor, ceiling]. Optional
+    waits (popups and the like) are skipped for the rest of a browser session
+    after they were absent `absent_after` times in a row.
+    """
+
+    def __init__(self, default=10, floor=2, ceiling=30, factor=2.0, quantile=0.95,
+                 min_samples=5, window=200, absent_after=2, poll=0.1):
+        self.default = default
+        self.floor = floor
+        self.ceiling = ceiling
+        self.factor = factor
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.absent_after = absent_after
+        self.poll = poll
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def observe(self, domain, seconds):
+        with self._lock:
+            self._samples[domain].append(seconds)
+
+    def percentile(self, domain, q=None):
+        """Observed latency percentile for a domain, or None without enough samples"""
+        with self._lock:
+            samples = sorted(self._samples[domain])
+        if len(samples) < self.min_samples:
+            return None
+        q = self.quantile if q is None else q
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout(self, domain):
+        p = self.percentile(domain)
+        if p is None:
+            return self.default
+        return max(self.floor, min(self.ceiling, p * self.factor))
+
+    def until(self, driver, condition, domain=None, timeout=None, required=True):
+        """
+        Wait for a DOM condition with the domain's adaptive timeout. Returns the
+        condition's value; with required=False a timeout returns None instead
+        of raising.
+        """
+        domain = domain or domain_of(driver.current_url)
+        start = time.monotonic()
+        try:
+            with metrics.phase("wait", domain):
+                result = WebDriverWait(driver, timeout or self.timeout(domain),
+                                       poll_frequency=self.poll).until(condition)
+        except TimeoutException:
+            if required:
+                raise
+            return None
+        self.observe(domain, time.monotonic() - start)
+        return result
+
+    def optional(self, session, key, condition, timeout=3):
+        """
+        Wait briefly for something that may not appear (e.g. a popup). Once it
+        was absent `absent_after` times in this session the wait is skipped.
+        """
+        misses = session.state.get(f"absent:{key}", 0)
+        if misses >= self.absent_after:
+            return None
+        try:
+            with metrics.phase("wait-optional", key):
+                result = WebDriverWait(session.driver, timeout, poll_frequency=self.poll).until(condition)
+        except TimeoutException:
+            session.state[f"absent:{key}"] = misses + 1
+            return None
+        session.state[f"absent:{key}"] = 0
+        return result
+
+    def page_ready(self, driver, domain=None, required=True):
+        """Wait until the document has at least been parsed"""
+        return self.until(
+            driver,
+            lambda d: d.execute_script("return document.readyState") in ("interactive", "complete"),
+            domain, required=required
+        )
+
+# Shared by every scraper in the process so latency observations accumulate
+waiter = AdaptiveWaiter()
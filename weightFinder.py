@@ -1,73 +1,74 @@
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-import re
+from concurrent.futures import ProcessPoolExecutor
+import os
 
-def extract_model_number(driver):
-    """Extract model number using Selenium, returns ' ' if unavailable"""
-    paragraphs = driver.find_elements(By.TAG_NAME, "p")
-    for p in paragraphs:
-        if "رقم الموديل" in p.text:
-            model_text = p.text.split(":")[-1].strip()
+from metrics import metrics
+from page_extract import parse_html, visible_text
+from stage_data import write_dataset
+from weight_units import parse_weight
+
+def parse_body(body_html):
+    """Parse a row's Body (HTML) into (paragraph texts, full body text) without a browser"""
+    root = parse_html(body_html)
+    if root is None:
+        return [], ""
+    paragraphs = [p.text_content().strip() for p in root.iter("p")]
+    return paragraphs, visible_text(root)
+
+def extract_name_en(paragraphs):
+    """Extract English product name, returns 'Unknown' if unavailable"""
+    for text in paragraphs:
+        if "اسم المنتج بالإنجليزي" in text:
+            return text.split(":")[-1].strip()
+    return "Unknown"
+
+def extract_model_number(paragraphs):
+    """Extract model number from paragraph texts, returns ' ' if unavailable"""
+    for text in paragraphs:
+        if "رقم الموديل" in text:
+            model_text = text.split(":")[-1].strip()
             if "غير متوفر" in model_text or not model_text:
                 return " "
             return model_text
     return " "
 
-def extract_weight(driver):
-    """Comprehensive weight extraction using Selenium"""
-    full_text = driver.find_element(By.TAG_NAME, "body").text
-    weight_patterns = [
-        r"الوزن[\s:]*حوالي\s*([\d\.]+)\s*جرام",
-        r"الوزن[\s:]*([\d\.]+)\s*جرام",
-        r"وزنه[\s:]*([\d\.]+)\s*جرام",
-        r"([\d\.]+)\s*جرام",
-        r"([\d\.]+)\s*g\b"
-    ]
-    for pattern in weight_patterns:
-        match = re.search(pattern, full_text, re.IGNORECASE)
-        if match:
-            try:
-                return float(match.group(1)), "Automatic Extraction"
-            except ValueError:
-                continue
+def extract_weight(full_text):
+    """Single-pass weight extraction from the body text, in grams"""
+    match = parse_weight(full_text)
+    if match:
+        return match.grams, "Automatic Extraction"
     return 0, "Not Detected"
 
-# Set up Selenium WebDriver (you may need to specify the path to your driver)
-driver = webdriver.Chrome()  # or webdriver.Firefox(), etc.
-
-# Load data
-df = pd.read_csv("Products weight .html")
-results = []
-
-for _, row in df.iterrows():
-    # Load HTML content into Selenium
-    driver.get("data:text/html;charset=utf-8," + row['Body (HTML)'])
-    
-    # Extract English name
-    name_en = "Unknown"
-    paragraphs = driver.find_elements(By.TAG_NAME, "p")
-    for p in paragraphs:
-        if "اسم المنتج بالإنجليزي" in p.text:
-            name_en = p.text.split(":")[-1].strip()
-            break
-    
-    # Extract model number
-    model_num = extract_model_number(driver)
-    
-    # Extract weight and method
-    weight, method = extract_weight(driver)
-    
-    results.append({
-        "Product Name": name_en,
-        "Model Number": model_num,
+def process_body(body_html):
+    """Build one output row from a product's Body (HTML)"""
+    paragraphs, full_text = parse_body(body_html)
+    weight, method = extract_weight(full_text)
+    return {
+        "Product Name": extract_name_en(paragraphs),
+        "Model Number": extract_model_number(paragraphs),
         "Weight": weight,
         "Detection Method": method
-    })
-# Close the browser
-driver.quit()
+    }
+
+def main():
+    # Load data
+    df = pd.read_csv("Products weight .html")
+    bodies = df['Body (HTML)'].tolist()
+
+    # Parse every row across a process pool; map() keeps the input order
+    workers = os.cpu_count() or 1
+    chunksize = max(1, len(bodies) // (workers * 8))
+    with metrics.phase("extraction", "body-html"), ProcessPoolExecutor(max_workers=workers) as exe:
+        results = list(exe.map(process_body, bodies, chunksize=chunksize))
+    metrics.count("page", "body-html", len(bodies))
+    for row in results:
+        metrics.outcome("weightFinder", row["Weight"] > 0, row["Detection Method"])
+
+    # Save as the typed dataset the scrapers start from
+    output_df = pd.DataFrame(results, columns=["Product Name", "Model Number", "Weight", "Detection Method"])
+    path = write_dataset(output_df, "product_details")
+    metrics.report("weightFinder", out=print)
+    print(f" Done! Dataset saved as '{path}' with detection methods column.")
 
-# Save to Excel
-output_df = pd.DataFrame(results)
-output_df.to_excel("product_details.xlsx", index=False)
-print(" Done! File saved with detection methods column.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
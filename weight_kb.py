@@ -0,0 +1,372 @@
+import os
+import re
+import math
+import glob
+import time
+import sqlite3
+import argparse
+import threading
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+from metrics import metrics
+from url_index import normalize_model
+from variants import canonical_name
+from weight_units import to_grams
+
+KB_PATH = os.environ.get("SCRAPER_WEIGHT_KB", "weight_kb.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS weights (
+    id          INTEGER PRIMARY KEY,
+    name        TEXT NOT NULL,
+    name_key    TEXT NOT NULL UNIQUE,
+    grams       REAL NOT NULL,
+    method      TEXT,
+    source      TEXT,
+    confidence  REAL NOT NULL,
+    recorded_at REAL NOT NULL,
+    ngrams      INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS models (
+    model_key   TEXT PRIMARY KEY,
+    entry       INTEGER NOT NULL REFERENCES weights(id)
+);
+CREATE TABLE IF NOT EXISTS trigrams (
+    gram        TEXT NOT NULL,
+    entry       INTEGER NOT NULL REFERENCES weights(id),
+    PRIMARY KEY (gram, entry)
+) WITHOUT ROWID;
+"""
+
+# Minimum Dice similarity of two names' trigram sets for a fuzzy hit
+FUZZY_THRESHOLD = 0.85
+# Keys per IN (...) query when looking many products up at once
+LOOKUP_CHUNK = 500
+# Known weights less trusted than this are scraped again (LLM guesses, variants of regex hits)
+MIN_CONFIDENCE = 0.6
+# Only answers at least this trusted are learned: spec tables, Amazon detail
+# sections, support previews and hand-entered weights, not regex guesses over
+# free text (body extraction, full-page fallbacks) or the LLM
+LEARN_CONFIDENCE = 0.8
+
+# How far a found weight is trusted, by Detection Method (longest matching prefix wins)
+METHOD_CONFIDENCE = {
+    "manual": 1.0,
+    "scraper": 0.95,
+    "ddg→amazon": 0.85,
+    "ddg→amazon(full_page_regex)": 0.6,
+    "support-preview": 0.8,
+    "support-full": 0.7,
+    "Automatic Extraction": 0.7,
+    "API": 0.5,
+}
+VARIANT_PENALTY = 0.9   # weight copied from another colour/storage variant
+
+# Tokens that must agree between a name and its fuzzy match: a different
+# number, edition or accessory word is a different product, however similar
+EDITIONS = {"pro", "pro+", "plus", "lite", "max", "ultra", "mini", "se", "neo", "prime",
+            "fe", "air", "active", "kids", "gen"}
+ACCESSORIES = {"filter", "filters", "cartridge", "desiccant", "case", "cover", "strap", "charger",
+               "cable", "adapter", "refill", "replacement", "head", "heads", "bag", "mount",
+               "stand", "holder", "battery", "remote"}
+
+class Known(NamedTuple):
+    grams: float
+    method: str
+    source: str
+    confidence: float
+    recorded_at: float
+    match: str                  # 'model', 'name' or 'fuzzy'
+    similarity: float = 1.0
+
+def method_confidence(method):
+    method = str(method or "")
+    base = method[:-len(" (variant)")] if method.endswith(" (variant)") else method
+    prefixes = [p for p in METHOD_CONFIDENCE if base.startswith(p)]
+    score = METHOD_CONFIDENCE[max(prefixes, key=len)] if prefixes else 0.5
+    return score * VARIANT_PENALTY if base != method else score
+
+MODEL_SEPARATORS = re.compile(r"[(),;]|\bor\b|أو")
+DIGIT = re.compile(r"\d")
+
+def model_keys(model):
+    """'MCCGQ02HL (أو BHR5154GL)' → ['MCCGQ02HL', 'BHR5154GL']; codes without a digit ('GL') are dropped"""
+    text = str(model if model is not None else "")
+    if not DIGIT.search(text):
+        return []
+    keys = (normalize_model(part) for part in MODEL_SEPARATORS.split(text))
+    return [key for key in keys if key and len(key) >= 3 and DIGIT.search(key)]
+
+def trigrams(name_key):
+    padded = f" {name_key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _distinguishing(name_key):
+    return {t for t in name_key.split()
+            if t in EDITIONS or t in ACCESSORIES or any(c.isdigit() for c in t)}
+
+# ── Knowledge base ─────────────────────────────────────────────────────────────
+class WeightKB:
+    """
+    Weights resolved by any run, keyed by canonical product name (colour,
+    storage and region words removed) and by every model number seen for
+    it. Each entry keeps its source, Detection Method, confidence and date;
+    a new answer only replaces one it is at least as confident as.
+
+    Names that match no key exactly are looked up through a trigram index:
+    candidates sharing the most trigrams are ranked by Dice similarity, and
+    the best one counts if it reaches `threshold` and agrees on numbers,
+    edition and accessory words.
+    """
+
+    def __init__(self, path=KB_PATH, threshold=FUZZY_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._gram_counts = None
+
+    def _row(self, where, args):
+        return self._db.execute(
+            f"SELECT id, grams, method, source, confidence, recorded_at FROM weights WHERE {where}", args
+        ).fetchone()
+
+    def put(self, name, grams, method=None, source=None, model=None, confidence=None, recorded_at=None):
+        """Record a found weight; False if a more confident answer is already known"""
+        return self.put_many([(name, grams, method, source, model)], confidence, recorded_at) > 0
+
+    def put_many(self, records, confidence=None, recorded_at=None):
+        """
+        Record (name, grams, method, source, model) tuples in one transaction;
+        returns how many entries were stored. An entry is only replaced by an
+        answer at least as confident, and a model number points at its most
+        confident entry.
+        """
+        recorded_at = recorded_at or time.time()
+        entries, links, scores, grams_of = {}, {}, {}, {}
+        for name, grams, method, source, model in records:
+            name_key = canonical_name(name)
+            if not name_key or not grams or grams <= 0:
+                continue
+            if method not in scores:
+                scores[method] = method_confidence(method) if confidence is None else confidence
+            score = scores[method]
+            if name_key not in entries or entries[name_key][5] <= score:
+                if name_key not in grams_of:
+                    grams_of[name_key] = trigrams(name_key)
+                entries[name_key] = (str(name), name_key, float(grams), method, source, score, recorded_at,
+                                     len(grams_of[name_key]))
+            for key in model_keys(model):
+                if key not in links or links[key][2] <= score:
+                    links[key] = (key, name_key, score)
+        if not entries:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                (last_id,) = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM weights").fetchone()
+                stored = self._db.executemany(
+                    "INSERT INTO weights(name, name_key, grams, method, source, confidence, recorded_at, ngrams) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(name_key) DO UPDATE SET grams = excluded.grams, method = excluded.method, "
+                    "source = excluded.source, confidence = excluded.confidence, recorded_at = excluded.recorded_at "
+                    "WHERE excluded.confidence >= weights.confidence",
+                    entries.values()
+                ).rowcount
+                # Only entries new to the table need their trigrams indexed
+                added = self._db.execute("SELECT id, name_key FROM weights WHERE id > ?", (last_id,)).fetchall()
+                self._db.executemany("INSERT OR IGNORE INTO trigrams VALUES (?, ?)",
+                                     [(g, entry) for entry, name_key in added for g in grams_of[name_key]])
+                self._db.executemany(
+                    "INSERT INTO models(model_key, entry) SELECT ?, id FROM weights WHERE name_key = ? "
+                    "ON CONFLICT(model_key) DO UPDATE SET entry = excluded.entry "
+                    "WHERE COALESCE((SELECT confidence FROM weights WHERE id = models.entry), 0) <= ?",
+                    links.values()
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            finally:
+                self._gram_counts = None
+        return stored
+
+    def get(self, name, model=None, fuzzy=True) -> Optional[Known]:
+        """Best known weight for a product: by model number, then exact name, then fuzzy name"""
+        return self.get_many([name], [model], fuzzy)[0]
+
+    def get_many(self, names, models, fuzzy=True):
+        """get() for many products at once: one query per batch of keys instead of per name"""
+        name_keys = [canonical_name(name) for name in names]
+        model_lists = [model_keys(model) for model in models]
+        with self._lock:
+            by_model = self._lookup("m.model_key", "models m JOIN weights w ON w.id = m.entry",
+                                    {key for keys in model_lists for key in keys})
+            by_name = self._lookup("w.name_key", "weights w", set(filter(None, name_keys)))
+            found, fuzzy_hits = [], {}
+            for name_key, keys in zip(name_keys, model_lists):
+                hit = next((Known(*by_model[key], "model") for key in keys if key in by_model), None)
+                # Blank and placeholder names ('Unknown') have no key: only a model number finds them
+                if hit is None and name_key:
+                    if name_key in by_name:
+                        hit = Known(*by_name[name_key], "name")
+                    elif fuzzy:
+                        if name_key not in fuzzy_hits:
+                            fuzzy_hits[name_key] = self._fuzzy(name_key)
+                        hit = fuzzy_hits[name_key]
+                found.append(hit)
+        return found
+
+    def _lookup(self, key_col, tables, keys):
+        """{key: (grams, method, source, confidence, recorded_at)} for the keys that are known"""
+        keys, rows = list(keys), {}
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            rows.update((row[0], row[1:]) for row in self._db.execute(
+                f"SELECT {key_col}, w.grams, w.method, w.source, w.confidence, w.recorded_at FROM {tables} "
+                f"WHERE {key_col} IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return rows
+
+    def _frequencies(self):
+        """How many entries contain each trigram; read in one pass and kept until the next put"""
+        if self._gram_counts is None:
+            self._gram_counts = dict(self._db.execute("SELECT gram, COUNT(*) FROM trigrams GROUP BY gram"))
+        return self._gram_counts
+
+    def _fuzzy(self, name_key):
+        """
+        Best fuzzy match. A name at Dice similarity `threshold` shares all but
+        `slack` of the query's trigrams, so of any `probe` of them it holds at
+        least probe - slack. Only the rarest grams are probed, so common ones
+        ('xia', 'omi') that appear in most entries are never scanned.
+        """
+        query = trigrams(name_key)
+        wanted = _distinguishing(name_key)
+        needed = math.ceil(self.threshold * len(query) / (2 - self.threshold))
+        slack = len(query) - needed
+        counts = self._frequencies()
+        probe = sorted(query, key=lambda g: counts.get(g, 0))[:min(len(query), 2 * slack + 2)]
+        if sum(g in counts for g in probe) < len(probe) - slack:
+            return None
+        candidates = self._db.execute(
+            f"SELECT w.id, w.name_key FROM weights w WHERE w.ngrams BETWEEN ? AND ? AND w.id IN ("
+            f"SELECT entry FROM trigrams WHERE gram IN ({','.join('?' * len(probe))}) "
+            f"GROUP BY entry HAVING COUNT(*) >= ?)",
+            [needed, math.floor(len(query) * (2 - self.threshold) / self.threshold)] + probe
+            + [len(probe) - slack]
+        ).fetchall()
+        best = None
+        for entry, other in candidates:
+            other_grams = trigrams(other)
+            score = 2 * len(query & other_grams) / (len(query) + len(other_grams))
+            if score >= self.threshold and _distinguishing(other) == wanted and (best is None or score > best[1]):
+                best = (entry, score)
+        if best is None:
+            return None
+        row = self._row("id = ?", (best[0],))
+        return Known(*row[1:], "fuzzy", round(best[1], 3))
+
+    def counts(self):
+        with self._lock:
+            entries, models = self._db.execute(
+                "SELECT (SELECT COUNT(*) FROM weights), (SELECT COUNT(*) FROM models)"
+            ).fetchone()
+        return {"entries": entries, "model numbers": models}
+
+    # ── DataFrame helpers ──────────────────────────────────────────────────────
+    def fill(self, df, name_col="Product Name", model_col="Model Number", unit_col=None, min_confidence=MIN_CONFIDENCE):
+        """
+        Fill rows still at Weight 0 from the knowledge base, before any
+        scraping. Filled rows get 'kb(<method>)' as Detection Method
+        ('kb-fuzzy(...)' for approximate matches). Returns the number filled.
+        """
+        missing = df.index[df["Weight"] == 0]
+        models = df.loc[missing, model_col] if model_col in df.columns else pd.Series(None, index=missing)
+        known = pd.Series(self.get_many(df.loc[missing, name_col].tolist(), models.tolist()), index=missing,
+                          dtype=object).dropna()
+        known = known[[k.confidence >= min_confidence for k in known]]
+        if known.empty:
+            return 0
+        matches = pd.Series([k.match for k in known], index=known.index)
+        df.loc[known.index, "Weight"] = [k.grams for k in known]
+        df.loc[known.index, "Detection Method"] = [f"{'kb-fuzzy' if k.match == 'fuzzy' else 'kb'}({k.method})"
+                                                   for k in known]
+        if unit_col:
+            df.loc[known.index, unit_col] = "g"
+        for match, n in matches.value_counts().items():
+            metrics.count(f"kb-{match}", "weight-kb", n)
+        return len(known)
+
+    def learn(self, df, source, name_col="Product Name", model_col="Model Number", unit_col=None):
+        """
+        Record the weights df holds from trusted methods (LEARN_CONFIDENCE)
+        that didn't come from the knowledge base; returns rows stored
+        """
+        methods = df["Detection Method"].astype(str) if "Detection Method" in df.columns \
+            else pd.Series("", index=df.index)
+        trusted = methods.map({m: method_confidence(m) for m in methods.unique()}) >= LEARN_CONFIDENCE
+        found = df[(df["Weight"] > 0) & ~methods.str.startswith("kb") & trusted]
+        models = found[model_col] if model_col in found.columns else pd.Series(None, index=found.index)
+        grams = found["Weight"].astype(float)
+        if unit_col:
+            factors = {u: to_grams(1, u.strip()) for u in found[unit_col].unique() if isinstance(u, str) and u.strip()}
+            grams = grams * found[unit_col].map(factors).fillna(1)
+        return self.put_many(zip(found[name_col].tolist(), grams.tolist(), methods[found.index].tolist(),
+                                 [source] * len(found), list(models)))
+
+    def close(self):
+        self._db.close()
+
+# Shared by every scraper in the process
+weight_kb = WeightKB()
+
+# ── Command line ───────────────────────────────────────────────────────────────
+def import_workbooks(kb, paths):
+    """Load earlier result sheets (Product Name / Model Number / Weight / Detection Method)"""
+    total = 0
+    for path in paths:
+        df = pd.read_excel(path)
+        if "Weight" not in df.columns or "Product Name" not in df.columns:
+            print(f"⏭️ {path}: no Product Name/Weight columns")
+            continue
+        df["Weight"] = pd.to_numeric(df["Weight"], errors="coerce").fillna(0)
+        methods = df["Detection Method"] if "Detection Method" in df.columns else pd.Series(None, index=df.index)
+        # Same bar as learn(): regex guesses and LLM answers aren't carried over
+        found = df[(df["Weight"] > 0) & (methods.map(method_confidence) >= LEARN_CONFIDENCE)]
+        models = found["Model Number"] if "Model Number" in found.columns else [None] * len(found)
+        methods = methods[found.index]
+        recorded_at = os.path.getmtime(path)
+        stored = kb.put_many(((name, grams, method if isinstance(method, str) else None, os.path.basename(path), model)
+                              for name, grams, model, method in zip(found["Product Name"], found["Weight"], models, methods)),
+                             recorded_at=recorded_at)
+        print(f"✅ {path}: {stored} of {len(found)} weights stored")
+        total += stored
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Weights resolved by earlier runs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("import", help="load result workbooks")
+    load.add_argument("paths", nargs="*", default=sorted(glob.glob("finalRes/*.xlsx")))
+    find = sub.add_parser("lookup", help="look a product up")
+    find.add_argument("name")
+    find.add_argument("--model", default=None)
+    sub.add_parser("stats", help="entry counts")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        import_workbooks(weight_kb, args.paths)
+        print(f"📚 {weight_kb.counts()}")
+    elif args.command == "lookup":
+        known = weight_kb.get(args.name, args.model)
+        print(known._asdict() if known else "Not known")
+    else:
+        print(weight_kb.counts())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import re
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+# ── 1. Units ───────────────────────────────────────────────────────────────────
+# Every spelling we accept, mapped to its canonical unit
+UNIT_ALIASES = {
+    'kg': 'kg', 'kgs': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'g': 'g', 'gr': 'g', 'gram': 'g', 'grams': 'g',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    # Arabic
+    'كجم': 'kg', 'كغ': 'kg', 'كيلو': 'kg', 'كيلوجرام': 'kg', 'كيلوغرام': 'kg',
+    'جرام': 'g', 'غرام': 'g', 'جم': 'g', 'غ': 'g',
+    'رطل': 'lb',
+    'أونصة': 'oz', 'اونصة': 'oz', 'أونصه': 'oz', 'اونصه': 'oz',
+}
+
+# Canonical unit → grams
+UNIT_GRAMS = {'kg': 1000.0, 'g': 1.0, 'lb': 453.592, 'oz': 28.3495}
+
+# Words that mark a number as "the" weight rather than any mass in the text
+WEIGHT_KEYWORDS = (
+    'item weight', 'shipping weight', 'product weight', 'net weight', 'weight',
+    'الوزن', 'وزنه', 'وزن',
+)
+
+# "5G", "2.4G/5G", "4G network", "Redmi Note 13 5G" at a line end: band names, not grams,
+# even after a weight keyword. Without one, no unspaced uppercase "<n>G" is read as a weight.
+NETWORK_WORDS = ('network', 'networks', 'connectivity', 'lte', 'band', 'bands', 'wifi', 'wi-fi',
+                 'شبكة', 'شبكات')
+
+# Arabic-Indic digits and decimal separator → ASCII (same length, so spans line up)
+ARABIC_DIGITS = str.maketrans('٠١٢٣٤٥٦٧٨٩٫', '0123456789.')
+
+# ── 2. Single-pass matcher ─────────────────────────────────────────────────────
+def _alternation(words):
+    # Longest first so 'kg' wins over 'g' and 'ounces' over 'oz'
+    return '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+_NETWORK = r'(?-i:\d(?:\.\d)?G)(?:[/,)\n]|\.(?!\d)|$|\s*(?:' + _alternation(NETWORK_WORDS) + r')\b)'
+
+WEIGHT_RE = re.compile(
+    # The keyword may sit on the line above its value ("Weight\n 190g")
+    r'(?:\b(?P<kw>' + _alternation(WEIGHT_KEYWORDS) + r')\b[^\d\n]{0,40}?(?:\n[^\d\n]{0,40}?)?)?'
+    r'(?<![\w.])(?!' + _NETWORK + r')'
+    r'(?P<num>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)'
+    # Without a keyword, "5G" / "14T 5G smartphone" is a network band, never a weight
+    r'(?(kw)|(?!(?-i:G)(?![^\W\d_])))\s*'
+    r'(?P<unit>' + _alternation(UNIT_ALIASES) + r')(?![^\W\d_])',
+    re.IGNORECASE
+)
+
+class WeightMatch(NamedTuple):
+    value: float
+    unit: str
+    grams: float
+    keyed: bool
+    text: str
+
+def to_grams(value, unit):
+    """Convert a value in any known unit spelling to grams"""
+    return float(value) * UNIT_GRAMS[UNIT_ALIASES[unit.lower()]]
+
+def _rank(m):
+    # Keyword-anchored first, then spelled-out units, then a bare 'g' ("5G" is often not a weight)
+    return m.group('kw') is None, m.group('unit').lower() == 'g'
+
+def _build(m):
+    value = float(m.group('num').replace(',', ''))
+    unit = UNIT_ALIASES[m.group('unit').lower()]
+    return WeightMatch(value, unit, value * UNIT_GRAMS[unit], m.group('kw') is not None, m.group(0))
+
+def parse_weight(text, keyed_only=False, keywords=None) -> Optional[WeightMatch]:
+    """
+    Scan text once for weights. The first keyword-anchored weight wins
+    ("Item Weight: 1.2 kg", "الوزن: حوالي 48 جرام"), then the first bare
+    "<number> <unit>" with a spelled-out unit ("300 جرام", "1.2 kg"), then
+    the first bare "<number> g"; an unspaced "<number>G" only counts after
+    a keyword. `keywords` narrows which of WEIGHT_KEYWORDS count as
+    anchors. Returns None when nothing matches.
+    """
+    if not isinstance(text, str) or not text:
+        return None
+    best = None
+    for m in WEIGHT_RE.finditer(text.translate(ARABIC_DIGITS)):
+        if m.group('kw') is not None and (keywords is None or m.group('kw').lower() in keywords):
+            return _build(m)
+        if best is None or _rank(m) < _rank(best):
+            best = m
+    if best is None or keyed_only:
+        return None
+    return _build(best)
+
+# ── 3. Vectorized column API ───────────────────────────────────────────────────
+def weights_to_grams(series, keyed_only=False):
+    """
+    Normalize a whole column of weight strings to grams in one call, using the
+    same matching rules as parse_weight. Unparseable cells become NaN.
+    """
+    text = series.astype('string').str.translate(ARABIC_DIGITS).reset_index(drop=True)
+    out = pd.Series(float('nan'), index=text.index, dtype='float64')
+
+    found = text.str.extractall(WEIGHT_RE)
+    if keyed_only:
+        found = found[found['kw'].notna()]
+    if not found.empty:
+        found.index = found.index.set_names(['row', 'match'])
+        found = found.reset_index()
+        found['unkeyed'] = found['kw'].isna()
+        found['bare_g'] = found['unit'].str.lower() == 'g'
+        best = found.sort_values(['row', 'unkeyed', 'bare_g', 'match']).drop_duplicates('row')
+        num = pd.to_numeric(best['num'].str.replace(',', '', regex=False), errors='coerce')
+        factor = best['unit'].str.lower().map(UNIT_ALIASES).map(UNIT_GRAMS)
+        out.loc[best['row'].to_numpy()] = (num * factor).to_numpy(dtype='float64')
+
+    out.index = series.index
+    return out
@@ -0,0 +1,316 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import sqlite3
+import argparse
+import threading
+from typing import NamedTuple
+
+import pandas as pd
+
+QUEUE_PATH = os.environ.get("SCRAPER_QUEUE_PATH", "work_queue.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    stage       TEXT NOT NULL,
+    row         INTEGER NOT NULL,
+    product     TEXT NOT NULL,
+    model       TEXT NOT NULL DEFAULT '',
+    status      TEXT NOT NULL DEFAULT 'pending',   -- pending | leased | done | failed
+    worker      TEXT,
+    token       TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    weight      REAL,
+    unit        TEXT,
+    method      TEXT,
+    source      TEXT,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (stage, row)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items(stage, status, lease_until);
+"""
+
+def read_queue_results(stages=None, path=QUEUE_PATH):
+    """Found weights of every stage (or just `stages`), shaped like result_store.read_results()"""
+    columns = ["stage", "row", "product", "weight", "unit", "method", "source"]
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns)
+    query = f"SELECT {', '.join(columns)} FROM items WHERE status = 'done' AND weight IS NOT NULL"
+    if stages:
+        query += f" AND stage IN ({','.join('?' * len(stages))})"
+    with sqlite3.connect(path) as db:
+        return pd.read_sql_query(query, db, params=list(stages or []))
+
+class Lease(NamedTuple):
+    row: int
+    product: str
+    model: str
+    token: str
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """
+    Durable queue of products per stage, shared by any number of worker
+    processes. lease() hands out pending items with a deadline; an item
+    whose worker died returns to 'pending' once its lease expires. Every
+    lease carries a token, and complete()/release() only take effect for
+    the current token, so a reclaimed item is never committed twice.
+
+    The file is opened in WAL mode, which needs shared memory between the
+    processes: every worker must run on the host that holds the file, and
+    the file must not live on a network filesystem.
+    """
+
+    def __init__(self, stage, path=QUEUE_PATH, max_attempts=3):
+        self.stage = stage
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def enqueue(self, items):
+        """items: iterable of (row, product, model); rows already queued for this stage are kept"""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO items(stage, row, product, model, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(self.stage, int(row), str(product), str(model or ""), now) for row, product, model in items]
+            )
+
+    def lease(self, n=1, ttl=300, worker=None):
+        """Claim up to n items for `ttl` seconds; expired leases are reclaimed first"""
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Same attempt limit as release(): an item whose worker keeps dying fails for good
+                self._db.execute(
+                    "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                    "worker = NULL, token = NULL, lease_until = NULL, updated_at = ? "
+                    "WHERE stage = ? AND status = 'leased' AND lease_until < ?",
+                    (self.max_attempts, now, self.stage, now)
+                )
+                rows = self._db.execute(
+                    "SELECT row, product, model FROM items WHERE stage = ? AND status = 'pending' "
+                    "ORDER BY attempts, row LIMIT ?",
+                    (self.stage, n)
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE items SET status = 'leased', worker = ?, token = ?, lease_until = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE stage = ? AND row = ?",
+                    [(worker or worker_id(), token, now + ttl, now, self.stage, row) for row, _, _ in rows]
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [Lease(row, product, model, token) for row, product, model in rows]
+
+    def renew(self, lease, ttl=300):
+        """Extend a lease still held; False if it was already reclaimed"""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE items SET lease_until = ? WHERE stage = ? AND row = ? AND token = ? AND status = 'leased'",
+                (time.time() + ttl, self.stage, lease.row, lease.token)
+            )
+        return cur.rowcount == 1
+
+    def complete(self, lease, weight=None, unit=None, method=None, source=None):
+        """Commit a finished item (weight=None: searched, not found); False if the lease was lost"""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE items SET status = 'done', weight = ?, unit = ?, method = ?, source = ?, "
+                "token = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE stage = ? AND row = ? AND token = ? AND status = 'leased'",
+                (weight, unit, method, source, time.time(), self.stage, lease.row, lease.token)
+            )
+        return cur.rowcount == 1
+
+    def complete_and_forward(self, lease, next_stage, source=None):
+        """
+        Commit a miss and queue it for `next_stage` in one transaction, so a
+        crash can't lose it in between; False (and nothing queued) if the
+        lease was lost
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._db.execute(
+                    "UPDATE items SET status = 'done', weight = NULL, unit = NULL, method = NULL, source = ?, "
+                    "token = NULL, lease_until = NULL, updated_at = ? "
+                    "WHERE stage = ? AND row = ? AND token = ? AND status = 'leased'",
+                    (source, now, self.stage, lease.row, lease.token)
+                )
+                if cur.rowcount == 1:
+                    self._db.execute(
+                        "INSERT OR IGNORE INTO items(stage, row, product, model, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (next_stage, lease.row, lease.product, lease.model, now)
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return cur.rowcount == 1
+
+    def release(self, lease):
+        """Give an item back after an error; it fails for good after max_attempts leases"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, token = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE stage = ? AND row = ? AND token = ? AND status = 'leased'",
+                (self.max_attempts, time.time(), self.stage, lease.row, lease.token)
+            )
+
+    def counts(self):
+        """{status: items} for this stage"""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM items WHERE stage = ? GROUP BY status", (self.stage,)
+            ).fetchall())
+
+    def apply(self, df, unit_col=None):
+        """Write every found weight of this stage back into df (same shape as ResultStore.apply)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT row, weight, unit, method FROM items "
+                "WHERE stage = ? AND status = 'done' AND weight IS NOT NULL",
+                (self.stage,)
+            ).fetchall()
+        for row, weight, unit, method in rows:
+            if row not in df.index:
+                continue
+            df.at[row, "Weight"] = weight
+            df.at[row, "Detection Method"] = method
+            if unit_col:
+                df.at[row, unit_col] = unit
+        return df
+
+    def close(self):
+        self._db.close()
+
+# ── Worker ─────────────────────────────────────────────────────────────────────
+async def work(stage, queue, next_queue=None, ttl=300, idle_exit=True):
+    """
+    Lease items one at a time on `stage.workers` concurrent loops and
+    resolve them with a pipeline Stage until the queue is drained. Misses
+    are forwarded to `next_queue` (the next stage's queue, in the same
+    file). Leases are renewed while their lookups are still running. Queue
+    calls can block on SQLite's busy timeout, so they run in threads.
+    """
+    if stage.setup:
+        await stage.setup()
+    in_flight = {}
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(ttl / 3)
+            for lease in list(in_flight.values()):
+                if not await asyncio.to_thread(queue.renew, lease, ttl):
+                    logging.warning(f"[{stage.name}] lease on row {lease.row} was reclaimed")
+
+    async def resolve(lease):
+        in_flight[lease.row] = lease
+        try:
+            result = await stage.lookup(lease.row, lease.product, lease.model)
+        except Exception as e:
+            logging.error(f"[{stage.name}] error for '{lease.product}': {e}")
+            await asyncio.to_thread(queue.release, lease)
+            return
+        finally:
+            in_flight.pop(lease.row, None)
+        if result is None:
+            if next_queue is not None:
+                await asyncio.to_thread(queue.complete_and_forward, lease, next_queue.stage, stage.name)
+            else:
+                await asyncio.to_thread(queue.complete, lease, source=stage.name)
+        else:
+            grams, method, source = result
+            await asyncio.to_thread(queue.complete, lease, grams, "g", method, source)
+            logging.info(f"[{stage.name}] '{lease.product}' → {grams} g")
+
+    async def loop():
+        while True:
+            leases = await asyncio.to_thread(queue.lease, 1, ttl)
+            if leases:
+                await resolve(leases[0])
+            elif idle_exit and not (await asyncio.to_thread(queue.counts)).get("leased"):
+                return
+            else:
+                # Others still hold leases that may expire and come back
+                await asyncio.sleep(min(ttl, 5))
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        await asyncio.gather(*(loop() for _ in range(stage.workers)))
+    finally:
+        beat.cancel()
+        if stage.teardown:
+            await stage.teardown()
+
+def main():
+    from pipeline import STAGES
+    from stage_data import read_dataset, write_dataset, export_excel
+    from weight_kb import weight_kb
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)8s | %(message)s")
+    parser = argparse.ArgumentParser(description="Shard weight lookups across worker processes on one host")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = sub.add_parser("enqueue", help="queue a dataset's rows with Weight == 0")
+    enqueue.add_argument("--input", default="product_details")
+    enqueue.add_argument("--stage", default="amazon", choices=list(STAGES))
+
+    worker = sub.add_parser("work", help="run one worker process")
+    worker.add_argument("--stage", required=True, choices=list(STAGES))
+    worker.add_argument("--next", default=None, choices=list(STAGES), help="queue misses for this stage")
+    worker.add_argument("--workers", type=int, default=4, help="concurrent lookups in this process")
+    worker.add_argument("--lease", type=float, default=300, help="lease timeout in seconds")
+
+    status = sub.add_parser("status", help="item counts per status")
+    status.add_argument("--stages", default=",".join(STAGES))
+
+    collect = sub.add_parser("collect", help="write queued results back into a dataset")
+    collect.add_argument("--input", default="product_details")
+    collect.add_argument("--output", default="queue_results.xlsx")
+    collect.add_argument("--stages", default=",".join(STAGES))
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        todo = read_dataset(args.input, columns=["Product Name", "Model Number", "Weight"], missing_only=True)
+        # Products the knowledge base already knows are filled on collect instead
+        weight_kb.fill(todo)
+        todo = todo[todo["Weight"] == 0]
+        models = todo["Model Number"] if "Model Number" in todo.columns else [""] * len(todo)
+        WorkQueue(args.stage).enqueue(zip(todo.index, todo["Product Name"], models))
+        print(f"✅ Queued {len(todo)} products for '{args.stage}'")
+    elif args.command == "work":
+        stage = STAGES[args.stage](args.workers)
+        next_queue = WorkQueue(args.next) if args.next else None
+        asyncio.run(work(stage, WorkQueue(args.stage), next_queue, ttl=args.lease))
+    elif args.command == "status":
+        for name in args.stages.split(","):
+            print(f"{name:<12} {WorkQueue(name).counts()}")
+    else:
+        df = read_dataset(args.input)
+        weight_kb.fill(df)
+        # Later stages only hold rows earlier ones missed, so the order doesn't matter
+        for name in args.stages.split(","):
+            WorkQueue(name).apply(df)
+        weight_kb.learn(df, "queue_results")
+        write_dataset(df, "queue_results")
+        export_excel(df, args.output)
+        print(f"✅ Saved as '{args.output}'")
+
+if __name__ == "__main__":
+    main()